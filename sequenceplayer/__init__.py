@@ -6,28 +6,167 @@ Sequence player
 
 import argparse
 import logging
+import os
+import sys
 
-from PySide2 import QtCore, QtWidgets
+from PySide2 import QtCore, QtGui, QtWidgets
+import sequenceplayer.cache as cache
+import sequenceplayer.canvas as canvas
+import sequenceplayer.diskcache as diskcache
+import sequenceplayer.fileio as fileio
 import sequenceplayer.mainwindow as mainwindow
+import sequenceplayer.playlist as playlist
+import sequenceplayer.prefetch as prefetch
+import sequenceplayer.profiling as profiling
 
 logger = logging.getLogger(__name__)
 
 
-def show(file_path=None, fps=25.0, live_update=False, **kwargs):
+def show(file_path=None, fps=25.0, live_update=False, cache_mb=cache.DEFAULT_CACHE_MB,
+         prefetch_workers=prefetch.DEFAULT_PREFETCH_WORKERS, prefetch_depth=prefetch.DEFAULT_PREFETCH_DEPTH, **kwargs):
+    profiling.STARTUP.lap('imports')
     app = QtCore.QCoreApplication.instance() or QtWidgets.QApplication([])
-    dlg = mainwindow.SequencePlayer(file_path=file_path, fps=fps, live_update=live_update, **kwargs)
+    profiling.STARTUP.lap('application')
+    server_name = kwargs.get('server_name')
+    if server_name:
+        import sequenceplayer.remote as remote
+        if remote.isRunning(server_name):
+            # A player with warm caches is already running, it loads the file instead of a new window. Options without
+            # a remote command (display and cache settings) stay as the running player has them
+            try:
+                if kwargs.get('playlist_paths'):
+                    remote.loadPlaylist(kwargs['playlist_paths'], server_name)
+                elif file_path:
+                    remote.load(file_path, server_name)
+                if file_path:
+                    if kwargs.get('compare_path'):
+                        remote.compare(kwargs['compare_path'], server_name)
+                    remote.setFps(fps, server_name)
+                logger.info('Handed %s to the sequence player on %s' % (file_path, server_name))
+                return
+            except remote.RemoteError as e:
+                logger.warning('Could not hand over to the sequence player on %s, opening a new window: %s' %
+                               (server_name, e))
+    dlg = mainwindow.SequencePlayer(file_path=file_path, fps=fps, live_update=live_update, cache_mb=cache_mb,
+                                    prefetch_workers=prefetch_workers, prefetch_depth=prefetch_depth, **kwargs)
     dlg.show()
     app.exec_()
 
 
-if __name__ == '__main__':
-    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s', level=logging.WARNING)
+def exportSequence(args):
+    if not args.input or len(args.input) > 1:
+        logger.error('--export needs a single --input sequence.')
+        return 1
+    args.input = args.input[0]
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    import sequenceplayer.export as export
+    app = QtCore.QCoreApplication.instance() or QtGui.QGuiApplication([])
+    frame_decoder = None
+    if args.decode_backend != 'thread':
+        import sequenceplayer.decoder as decoder
+        frame_decoder = decoder.createDecoder(args.decode_backend, args.decode_workers)
+    try:
+        written, failed, duration = export.run(args, frame_decoder)
+    except (ValueError, OSError) as e:
+        logger.error('Export failed: %s' % e)
+        return 1
+    finally:
+        if frame_decoder is not None:
+            frame_decoder.shutdown()
+    print('Exported %d files to %s in %.1f s%s' % (written, os.path.dirname(os.path.abspath(args.export)), duration,
+                                                   ', %d failed' % failed if failed else ''))
+    return 1 if failed else 0
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='WOODBLOCK SEQUENCE PLAYER')
-    parser.add_argument('--input', type=str, default=None, help='file or sequence path')
+    parser.add_argument('--input', type=str, nargs='+', action='append', default=[],
+                        help='file or sequence path, several make a playlist')
+    parser.add_argument('--playlist', type=str, default=None,
+                        help='text file with one file or sequence path per line, played after any --input')
     parser.add_argument('--fps', type=float, default=25.0, help='playback frames per second')
-    parser.add_argument('--liveupdate', action='store_true', help='check for new sequence files every %.1f seconds' %
-                                                                  mainwindow.LIVE_UPDATE_INTERVAL_SECONDS)
-    parser.add_argument('--verbose', action='store_true', help='print debug messages')
+    parser.add_argument('--liveupdate', action='store_true', help='watch for new sequence files (polled every %.1f seconds '
+                                                                  'where the directory cannot be watched, every %.1f '
+                                                                  'seconds for files written by other hosts)' %
+                                                                  (mainwindow.LIVE_UPDATE_INTERVAL_SECONDS,
+                                                                   mainwindow.LIVE_UPDATE_WATCHED_INTERVAL_SECONDS))
+    parser.add_argument('--proxy', action='store_true', help='decode at reduced resolution for faster playback')
+    parser.add_argument('--loop-cache', action='store_true',
+                        help='bake the loop range into a memory-mapped file of uncompressed frames')
+    parser.add_argument('--every-frame', action='store_true',
+                        help='never drop frames, playback slows down when decoding falls behind')
+    parser.add_argument('--cache-mb', type=float, default=cache.DEFAULT_CACHE_MB,
+                        help='memory budget for decoded frames in megabytes')
+    parser.add_argument('--cache-frames', type=int, default=None, help='maximum number of decoded frames kept in memory')
+    parser.add_argument('--disk-cache-dir', type=str, default=None,
+                        help='directory for downscaled frames kept across sessions (default: %s)' %
+                             diskcache.defaultCacheDir())
+    parser.add_argument('--disk-cache-mb', type=float, default=diskcache.DEFAULT_DISK_CACHE_MB,
+                        help='size cap of the on-disk frame cache in megabytes, 0 disables it')
+    parser.add_argument('--prefetch-workers', type=int, default=prefetch.DEFAULT_PREFETCH_WORKERS,
+                        help='background decode threads, 0 disables read-ahead')
+    parser.add_argument('--prefetch-depth', type=int, default=prefetch.DEFAULT_PREFETCH_DEPTH,
+                        help='number of frames decoded ahead of the playhead')
+    parser.add_argument('--decode-backend', type=str, default='thread', choices=prefetch.DECODE_BACKENDS,
+                        help='decode in background threads or in a pool of worker processes')
+    parser.add_argument('--decode-workers', type=int, default=None,
+                        help='worker processes for the process decode backend (default: one per core)')
+    parser.add_argument('--io-workers', type=int, default=fileio.DEFAULT_IO_WORKERS,
+                        help='threads reading files ahead of decode, raise it for network storage, 0 reads in the '
+                             'decode threads')
+    parser.add_argument('--exposure', type=float, default=0.0, help='display exposure in stops (needs numpy)')
+    parser.add_argument('--gamma', type=float, default=1.0, help='display gamma (needs numpy)')
+    parser.add_argument('--lut', type=str, default=None, help='.cube display LUT, 1D or 3D (needs numpy)')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='sequence shown against the input, first frames aligned, sharing the frame cache')
+    parser.add_argument('--compare-mode', type=str, default=canvas.COMPARE_WIPE, choices=canvas.COMPARE_MODES,
+                        help='wipe between the sequences or show them side by side')
+    parser.add_argument('--export', type=str, default=None,
+                        help='write a downscaled copy of the sequence (or contact sheets) to this path, # is replaced '
+                             'by the frame number, no window is opened')
+    parser.add_argument('--contact-sheet', action='store_true', help='export tiled contact sheets instead of frames')
+    # Unset export options take the defaults of sequenceplayer.export, only imported when exporting
+    parser.add_argument('--export-scale', type=float, default=None, help='scale of exported frames')
+    parser.add_argument('--columns', type=int, default=None, help='contact sheet columns')
+    parser.add_argument('--rows', type=int, default=None, help='contact sheet rows')
+    parser.add_argument('--tile-width', type=int, default=None, help='contact sheet tile width')
+    parser.add_argument('--first', type=int, default=None, help='first frame to export')
+    parser.add_argument('--last', type=int, default=None, help='last frame to export')
+    parser.add_argument('--step', type=int, default=1, help='export every nth frame')
+    parser.add_argument('--quality', type=int, default=-1, help='export image quality, 0 to 100')
+    parser.add_argument('--export-workers', type=int, default=None, help='export threads (default: one per core)')
+    parser.add_argument('--server', type=str, nargs='?', const='', default=None,
+                        help='accept remote commands on this local socket name (default: the name '
+                             'sequenceplayer.remote connects to), an --input given while a player already listens '
+                             'there is loaded by that player')
+    parser.add_argument('--hud', action='store_true', help='show the performance overlay')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='record hot path timings and write them to this .json or .csv file on exit')
+    parser.add_argument('--verbose', action='store_true', help='print debug messages and a startup time breakdown')
+    args = parser.parse_args(argv)
+    # Each --input is its own list, the extend action needs Python 3.8
+    args.input = [path for paths in args.input for path in paths]
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+                        level=logging.DEBUG if args.verbose else logging.WARNING)
+    if args.export:
+        return exportSequence(args)
     parser.print_help()
-    args = parser.parse_args()
-    show(file_path=args.input, fps=float(args.fps), live_update=args.liveupdate)
+    if args.server == '':
+        import sequenceplayer.remote as remote
+        args.server = remote.DEFAULT_SERVER_NAME
+    paths = list(args.input)
+    if args.playlist:
+        paths += playlist.readPlaylist(args.playlist)
+    show(file_path=paths[0] if paths else None, fps=float(args.fps), live_update=args.liveupdate,
+         cache_mb=args.cache_mb, cache_frames=args.cache_frames, prefetch_workers=args.prefetch_workers,
+         prefetch_depth=args.prefetch_depth,
+         play_every_frame=args.every_frame, proxy=args.proxy, disk_cache_dir=args.disk_cache_dir,
+         disk_cache_mb=args.disk_cache_mb, loop_cache=args.loop_cache, hud=args.hud, profile_path=args.profile,
+         decode_backend=args.decode_backend, decode_workers=args.decode_workers, exposure=args.exposure,
+         gamma=args.gamma, lut_path=args.lut, compare_path=args.compare, compare_mode=args.compare_mode,
+         io_workers=args.io_workers, playlist_paths=paths if len(paths) > 1 else None,
+         server_name=args.server)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player command line
+"""
+
+import sys
+
+import sequenceplayer
+
+if __name__ == '__main__':
+    sys.exit(sequenceplayer.main())
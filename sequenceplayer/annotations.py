@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player annotations
+"""
+
+import array
+import bisect
+import collections
+import json
+import logging
+import os
+
+from PySide2 import QtCore, QtGui
+
+import sequenceplayer.cache as cache
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = '.annotations.jsonl'
+DEFAULT_COLOR = '#ff3030'
+DEFAULT_WIDTH = 3.0
+OVERLAY_CACHE_MB = 256
+OVERLAY_NAMESPACE = 'annotations'
+# Rewrite the journal once it holds this many times more records than there are live strokes
+COMPACT_RATIO = 4
+COMPACT_MIN_RECORDS = 64
+
+# Points are normalized to the image (0-1) so strokes do not depend on zoom or proxy resolution
+Stroke = collections.namedtuple('Stroke', ['color', 'width', 'points'])
+
+
+def sidecarPath(sequence_path):
+    if not sequence_path or '#' not in sequence_path:
+        return None
+    prefix = os.path.basename(sequence_path).split('#', 1)[0].rstrip('._-') or 'sequence'
+    return os.path.join(os.path.dirname(sequence_path), prefix + SIDECAR_SUFFIX)
+
+
+def newStroke(points, color=DEFAULT_COLOR, width=DEFAULT_WIDTH):
+    return Stroke(color, float(width), array.array('f', points))
+
+
+# Strokes live only under frames that have any, next and previous annotation are a binary search over the sorted
+# frame list. Edits are journaled, saving appends only what changed since the last save
+class AnnotationStore(QtCore.QObject):
+    changed = QtCore.Signal(int)
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.path = None
+        self._frames = []
+        self._strokes = {}
+        self._pending = []
+        self._journal_records = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, frame):
+        return frame in self._strokes
+
+    def frames(self):
+        return list(self._frames)
+
+    def strokes(self, frame):
+        return self._strokes.get(frame, ())
+
+    def isModified(self):
+        return bool(self._pending)
+
+    def next(self, frame):
+        index = bisect.bisect_right(self._frames, frame)
+        return self._frames[index] if index < len(self._frames) else None
+
+    def previous(self, frame):
+        index = bisect.bisect_left(self._frames, frame)
+        return self._frames[index - 1] if index > 0 else None
+
+    def addStroke(self, frame, stroke):
+        if frame not in self._strokes:
+            bisect.insort(self._frames, frame)
+            self._strokes[frame] = []
+        self._strokes[frame].append(stroke)
+        self._pending.append(self.strokeRecord(frame, stroke))
+        self.changed.emit(frame)
+
+    def clearFrame(self, frame):
+        if frame not in self._strokes:
+            return
+        del self._strokes[frame]
+        del self._frames[bisect.bisect_left(self._frames, frame)]
+        self._pending.append({'op': 'clear', 'frame': frame})
+        self.changed.emit(frame)
+
+    def strokeRecord(self, frame, stroke):
+        return {'op': 'stroke', 'frame': frame, 'color': stroke.color, 'width': stroke.width,
+                'points': [round(value, 5) for value in stroke.points]}
+
+    def strokeCount(self):
+        return sum(len(strokes) for strokes in self._strokes.values())
+
+    def clear(self):
+        self._frames = []
+        self._strokes = {}
+        self._pending = []
+        self._journal_records = 0
+
+    def load(self, path):
+        self.clear()
+        self.path = path
+        if not path or not os.path.isfile(path):
+            return
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if record['op'] == 'stroke':
+                        stroke = newStroke(record['points'], record.get('color', DEFAULT_COLOR),
+                                           record.get('width', DEFAULT_WIDTH))
+                        if record['frame'] not in self._strokes:
+                            bisect.insort(self._frames, record['frame'])
+                            self._strokes[record['frame']] = []
+                        self._strokes[record['frame']].append(stroke)
+                    elif record['op'] == 'clear' and record['frame'] in self._strokes:
+                        del self._strokes[record['frame']]
+                        del self._frames[bisect.bisect_left(self._frames, record['frame'])]
+                except (ValueError, KeyError, TypeError) as e:
+                    # A save interrupted mid-line only loses that record
+                    logger.warning('Skipping bad annotation record %s:%d: %s' % (path, number, e))
+                    continue
+                self._journal_records += 1
+        logger.info('Loaded %d annotated frames from %s' % (len(self._frames), path))
+
+    def save(self):
+        if not self._pending:
+            return True
+        if not self.path:
+            logger.warning('Annotations of a single image are not saved.')
+            return False
+        try:
+            if self._journal_records + len(self._pending) > max(COMPACT_MIN_RECORDS,
+                                                                self.strokeCount() * COMPACT_RATIO):
+                self.compact()
+            else:
+                with open(self.path, 'a') as f:
+                    for record in self._pending:
+                        f.write(json.dumps(record) + '\n')
+                self._journal_records += len(self._pending)
+        except (IOError, OSError) as e:
+            logger.warning('Could not save annotations to %s: %s' % (self.path, e))
+            return False
+        self._pending = []
+        return True
+
+    def compact(self):
+        temp_path = self.path + '.tmp'
+        records = 0
+        with open(temp_path, 'w') as f:
+            for frame in self._frames:
+                for stroke in self._strokes[frame]:
+                    f.write(json.dumps(self.strokeRecord(frame, stroke)) + '\n')
+                    records += 1
+        os.replace(temp_path, self.path)
+        self._journal_records = records
+
+
+# Strokes rasterized once per frame and displayed size, playback only composites the cached layer
+class AnnotationOverlay(object):
+    def __init__(self, store, frame_cache=None, max_bytes=OVERLAY_CACHE_MB * 1024 * 1024):
+        self.store = store
+        self.cache = frame_cache if frame_cache is not None else cache.FrameCache(max_bytes=max_bytes)
+        self.store.changed.connect(self.discardFrame)
+
+    def discardFrame(self, frame):
+        self.cache.discardFrame(frame, OVERLAY_NAMESPACE)
+
+    def clear(self):
+        self.cache.discardNamespace(OVERLAY_NAMESPACE)
+
+    def image(self, frame, size):
+        if frame not in self.store or size.isEmpty():
+            return None
+        key = cache.frameKey(frame, (size.width(), size.height()), OVERLAY_NAMESPACE)
+        overlay = self.cache.get(key)
+        if overlay is None:
+            overlay = self.render(self.store.strokes(frame), size)
+            self.cache.put(key, overlay)
+        return overlay
+
+    def render(self, strokes, size):
+        overlay = QtGui.QImage(size, QtGui.QImage.Format_ARGB32_Premultiplied)
+        overlay.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(overlay)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        for stroke in strokes:
+            pen = QtGui.QPen(QtGui.QColor(stroke.color), stroke.width)
+            pen.setCapStyle(QtCore.Qt.RoundCap)
+            pen.setJoinStyle(QtCore.Qt.RoundJoin)
+            painter.setPen(pen)
+            painter.drawPolyline(QtGui.QPolygonF([QtCore.QPointF(stroke.points[i] * size.width(),
+                                                                 stroke.points[i + 1] * size.height())
+                                                  for i in range(0, len(stroke.points) - 1, 2)]))
+        painter.end()
+        return overlay
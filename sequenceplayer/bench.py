@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player headless benchmark
+
+python -m sequenceplayer.bench --width 3840 --height 2160 --length 100 --format jpg --output bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide2 import QtCore, QtGui, QtWidgets
+
+import sequenceplayer.cache as cache
+import sequenceplayer.mainwindow as mainwindow
+import sequenceplayer.prefetch as prefetch
+import sequenceplayer.profiling as profiling
+import sequenceplayer.sequence as sequence
+
+logger = logging.getLogger(__name__)
+
+BENCH_START_FRAME = 1001
+
+
+def summarize(samples_ms):
+    return {'count': len(samples_ms),
+            'mean_ms': sum(samples_ms) / len(samples_ms) if samples_ms else 0.0,
+            'p50_ms': profiling.percentile(samples_ms, 0.5),
+            'p95_ms': profiling.percentile(samples_ms, 0.95),
+            'max_ms': max(samples_ms) if samples_ms else 0.0}
+
+
+def generateSequence(directory, width, height, length, image_format='jpg', start=BENCH_START_FRAME):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    font = QtGui.QFont()
+    font.setPixelSize(max(12, height // 8))
+    for frame in range(start, start + length):
+        # Moving gradient and noise-free text keep the files realistic for the codec without a fixed size per frame
+        gradient = QtGui.QLinearGradient(0, 0, width, height)
+        gradient.setColorAt(0, QtGui.QColor.fromHsv((frame * 7) % 360, 200, 220))
+        gradient.setColorAt(1, QtGui.QColor.fromHsv((frame * 7 + 180) % 360, 200, 60))
+        painter = QtGui.QPainter(image)
+        painter.fillRect(image.rect(), gradient)
+        painter.setPen(QtCore.Qt.white)
+        painter.setFont(font)
+        painter.drawText(image.rect(), QtCore.Qt.AlignCenter, '%04d' % frame)
+        painter.end()
+        image.save(os.path.join(directory, 'bench.%04d.%s' % (frame, image_format)))
+    return os.path.join(directory, 'bench.#.%s' % image_format)
+
+
+def newSequence(file_path, cache_mb):
+    sequence_path, digits, frame = sequence.parseSequencePath(file_path)
+    image_sequence = sequence.Sequence(frame_cache=cache.FrameCache(max_bytes=int(cache_mb * 1024 * 1024)))
+    image_sequence.setPath(sequence_path, digits)
+    return image_sequence
+
+
+def benchDecode(file_path, cache_mb):
+    image_sequence = newSequence(file_path, cache_mb)
+    samples = []
+    pixels = 0
+    started = time.time()
+    for frame in image_sequence.index.frames():
+        timer = time.time()
+        image = image_sequence.getFrame(frame).getImage()
+        samples.append((time.time() - timer) * 1000.0)
+        pixels += image.width() * image.height() if image else 0
+    duration = time.time() - started
+    result = summarize(samples)
+    result.update({'fps': len(samples) / duration if duration else 0.0,
+                   'megapixels_per_second': pixels / 1000000.0 / duration if duration else 0.0,
+                   'bytes_read': sum(image_sequence.index.info(frame).size for frame in image_sequence.index.frames())})
+    return result
+
+
+def benchScale(file_path, cache_mb, frames=10):
+    image_sequence = newSequence(file_path, cache_mb)
+    results = {}
+    for frame in image_sequence.index.frames()[:frames]:
+        source = image_sequence.getFrame(frame).decodeImage()
+        for level in cache.MIP_LEVELS:
+            timer = time.time()
+            sequence.scaleImage(source, level)
+            results.setdefault('scale_%s' % level, []).append((time.time() - timer) * 1000.0)
+            if level < 1.0:
+                timer = time.time()
+                sequence.readImage(image_sequence.getFrame(frame).image_path, level)
+                results.setdefault('reduced_decode_%s' % level, []).append((time.time() - timer) * 1000.0)
+    return dict((key, summarize(samples)) for key, samples in sorted(results.items()))
+
+
+def benchScrub(file_path, cache_mb, seeks=50, seed=0):
+    image_sequence = newSequence(file_path, cache_mb)
+    frames = image_sequence.index.frames()
+    generator = random.Random(seed)
+    samples = []
+    for i in range(seeks):
+        frame = generator.choice(frames)
+        timer = time.time()
+        image_sequence.getFrame(frame).getImageScaled(1.0)
+        samples.append((time.time() - timer) * 1000.0)
+    result = summarize(samples)
+    result.update(image_sequence.frame_cache.stats())
+    return result
+
+
+def benchPlayback(file_path, fps, duration, cache_mb, workers, depth, proxy=False):
+    app = QtCore.QCoreApplication.instance()
+    player = mainwindow.SequencePlayer(fps=fps, cache_mb=cache_mb, prefetch_workers=workers, prefetch_depth=depth,
+                                       proxy=proxy, disk_cache_mb=0)
+    player.loadSequence(file_path)
+    player.ui.loop_checkbox.setChecked(True)
+    player.show()
+    player.playbackStart()
+    QtCore.QTimer.singleShot(int(duration * 1000), app.quit)
+    app.exec_()
+    player.playbackStop()
+    player._prefetcher.cancel()
+    player._prefetcher.wait()
+    stats = player._playback_stats
+    result = {'target_fps': fps,
+              'achieved_fps': stats.shown / duration if duration else 0.0,
+              'shown': stats.shown,
+              'dropped': stats.dropped,
+              'last_latency_ms': stats.latency_ms}
+    result.update(player._sequence.frame_cache.stats())
+    player.deleteLater()
+    return result
+
+
+def run(args):
+    app = QtCore.QCoreApplication.instance() or QtWidgets.QApplication([])
+    sequence.addImageFormatsSupport()
+    directory = None
+    if args.input:
+        file_path = args.input
+    else:
+        directory = tempfile.mkdtemp(prefix='sequenceplayer_bench_')
+        timer = time.time()
+        sequence_path = generateSequence(directory, args.width, args.height, args.length, args.format)
+        logger.info('Generated %d frames in %.1f s' % (args.length, time.time() - timer))
+        file_path = sequence_path.replace('#', '%04d' % BENCH_START_FRAME)
+    try:
+        results = {'decode': benchDecode(file_path, args.cache_mb),
+                   'scale': benchScale(file_path, args.cache_mb),
+                   'scrub': benchScrub(file_path, args.cache_mb, seed=args.seed),
+                   'playback': benchPlayback(file_path, args.fps, args.duration, args.cache_mb, args.workers,
+                                             args.depth),
+                   'playback_proxy': benchPlayback(file_path, args.fps, args.duration, args.cache_mb, args.workers,
+                                                   args.depth, proxy=True)}
+    finally:
+        if directory and not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+    return {'config': vars(args),
+            'environment': {'python': sys.version.split()[0],
+                            'qt': QtCore.qVersion(),
+                            'platform': platform.platform(),
+                            'cpu_count': os.cpu_count(),
+                            'qpa': app.platformName()},
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='WOODBLOCK SEQUENCE PLAYER BENCHMARK')
+    parser.add_argument('--input', type=str, default=None, help='benchmark an existing sequence instead')
+    parser.add_argument('--width', type=int, default=1920, help='synthetic frame width')
+    parser.add_argument('--height', type=int, default=1080, help='synthetic frame height')
+    parser.add_argument('--length', type=int, default=100, help='synthetic sequence length in frames')
+    parser.add_argument('--format', type=str, default='jpg', help='synthetic image format (jpg, png, tga, ...)')
+    parser.add_argument('--fps', type=float, default=24.0, help='playback frames per second')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of playback to measure')
+    parser.add_argument('--cache-mb', type=float, default=cache.DEFAULT_CACHE_MB, help='frame cache budget')
+    parser.add_argument('--workers', type=int, default=prefetch.DEFAULT_PREFETCH_WORKERS, help='prefetch workers')
+    parser.add_argument('--depth', type=int, default=prefetch.DEFAULT_PREFETCH_DEPTH, help='prefetch depth')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for scrub positions')
+    parser.add_argument('--keep', action='store_true', help='keep the generated sequence')
+    parser.add_argument('--output', type=str, default=None, help='write JSON here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help='print debug messages')
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+                        level=logging.DEBUG if args.verbose else logging.WARNING)
+    report = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player frame cache
+"""
+
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MB = 2048
+DEFAULT_CACHE_FRAMES = None
+MIP_LEVELS = (0.25, 0.5, 1.0, 2.0, 4.0)
+
+
+def mipLevel(scale):
+    return min(MIP_LEVELS, key=lambda level: abs(level - scale))
+
+
+def frameKey(frame, level, namespace=None):
+    return (frame, level) if namespace is None else (frame, level, namespace)
+
+
+def keyNamespace(key):
+    return key[2] if len(key) > 2 else None
+
+
+def imageBytes(image):
+    if image is None:
+        return 0
+    return image.width() * image.height() * image.depth() // 8
+
+
+# Keys are (frame, level) pairs, or (frame, level, namespace) when several sequences share one budget. Evicts least
+# recently used entries first, or farthest from the playhead of their namespace once a playhead is set. Entries of a
+# namespace without a playhead go first. Images derived from frames (display transforms, annotation layers) are kept
+# in the player's cache too so one budget covers everything held in memory, their namespace follows the namespace of
+# the source frames and goes together with them
+class FrameCache(object):
+    def __init__(self, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024, max_frames=DEFAULT_CACHE_FRAMES):
+        self.max_bytes = max_bytes
+        self.max_frames = max_frames
+        self.playheads = {}
+        self.sources = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items[key] = item
+            self.hits += 1
+            return item[0]
+
+    def peek(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            return item[0] if item is not None else None
+
+    def put(self, key, image):
+        if image is None:
+            return
+        size = imageBytes(image)
+        with self._lock:
+            self.discard(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                logger.debug('Frame %s (%d bytes) exceeds the cache budget, not cached.' % (key, size))
+                return
+            self._items[key] = (image, size)
+            self.bytes += size
+            self._evict(keep=key)
+
+    def nearest(self, frame, levels, namespace=None):
+        # Closest cached frame at any of the levels, without touching recency or hit counts
+        with self._lock:
+            keys = [key for key in self._items if key[1] in levels and keyNamespace(key) == namespace]
+            if not keys:
+                return None, None
+            key = min(keys, key=lambda key: (abs(key[0] - frame), levels.index(key[1])))
+            return key, self._items[key][0]
+
+    def discard(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self.bytes -= item[1]
+
+    def discardFrame(self, frame, namespace=None):
+        with self._lock:
+            for key in [key for key in self._items if key[0] == frame and keyNamespace(key) == namespace]:
+                self.discard(key)
+
+    def discardNamespace(self, namespace=None):
+        with self._lock:
+            for key in [key for key in self._items if keyNamespace(key) == namespace]:
+                self.discard(key)
+        self.playheads.pop(namespace, None)
+
+    def retainLevel(self, level, namespace=None):
+        # Other namespaces keep their levels, a shot left at another zoom is still there when it comes back
+        with self._lock:
+            for key in [key for key in self._items if key[1] != level and keyNamespace(key) == namespace]:
+                self.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def setPlayhead(self, frame, namespace=None):
+        self.playheads[namespace] = frame
+
+    def clearPlayhead(self, namespace=None):
+        self.playheads.pop(namespace, None)
+
+    def follow(self, namespace, source=None):
+        self.sources[namespace] = source
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {'frames': len(self._items),
+                    'bytes': self.bytes,
+                    'max_bytes': self.max_bytes,
+                    'max_frames': self.max_frames,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hit_rate': float(self.hits) / requests if requests else 0.0}
+
+    def _overBudget(self):
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            return True
+        if self.max_frames is not None and len(self._items) > self.max_frames:
+            return True
+        return False
+
+    def _victim(self, keep=None):
+        candidates = [key for key in self._items if key != keep]
+        if not candidates:
+            return None
+        if not self.playheads:
+            return candidates[0]
+
+        def distance(key):
+            namespace = keyNamespace(key)
+            playhead = self.playheads.get(self.sources.get(namespace, namespace))
+            return abs(key[0] - playhead) if playhead is not None else float('inf')
+
+        # Least recently used entries come first, so max() resolves equal distances in LRU order.
+        return max(candidates, key=distance)
+
+    def _evict(self, keep=None):
+        while self._overBudget():
+            key = self._victim(keep)
+            if key is None:
+                break
+            self.discard(key)
+            self.evictions += 1
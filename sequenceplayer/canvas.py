@@ -6,11 +6,197 @@ Sequence player canvas
 
 import logging
 
-from PySide2 import QtWidgets
+from PySide2 import QtCore, QtGui, QtWidgets
+
+import sequenceplayer.profiling as profiling
 
 logger = logging.getLogger(__name__)
 
+HUD_MARGIN = 8
+COMPARE_WIPE = 'wipe'
+COMPARE_SIDE = 'side'
+COMPARE_MODES = (COMPARE_WIPE, COMPARE_SIDE)
+COMPARE_SPACING = 4
+
+
+# Paints the current QImage centered at its zoom, a new frame of the same size is only a repaint and never touches
+# the layout, fast scaling is used while playing and smooth scaling once paused. A compare image is drawn into the
+# same size, either right of the wipe line (dragged with the mouse) or next to the image
+class ImageCanvas(QtWidgets.QWidget):
+    strokeFinished = QtCore.Signal(list)
 
-class ImageCanvas(QtWidgets.QLabel):
     def __init__(self, parent=None):
-        QtWidgets.QLabel.__init__(self, parent)
+        QtWidgets.QWidget.__init__(self, parent)
+        self.image = None
+        self.overlay = None
+        self.compare_image = None
+        self.compare_mode = None
+        self.wipe = 0.5
+        self.zoom = 1.0
+        self.smooth = True
+        self.hud_text = None
+        self.painting = False
+        self.stroke_pen = QtGui.QPen(QtGui.QColor(255, 48, 48), 3, QtCore.Qt.SolidLine, QtCore.Qt.RoundCap,
+                                     QtCore.Qt.RoundJoin)
+        self._stroke = None
+        self._wiping = False
+        self._image_size = QtCore.QSize()
+        self._display_size = QtCore.QSize()
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+
+    def sizeHint(self):
+        if self._display_size.isValid():
+            return self._display_size
+        return QtWidgets.QWidget.sizeHint(self)
+
+    def setImage(self, image, zoom=1.0):
+        self.image = image
+        self.zoom = zoom
+        self._image_size = image.size() * zoom if image is not None else QtCore.QSize()
+        self.updateDisplaySize()
+        self.update()
+
+    def setCompareImage(self, image):
+        if image is not self.compare_image:
+            self.compare_image = image
+            self.update()
+
+    def setCompareMode(self, mode):
+        self.compare_mode = mode
+        self.updateDisplaySize()
+        self.update()
+
+    def setWipe(self, wipe):
+        self.wipe = max(0.0, min(1.0, wipe))
+        self.update()
+
+    def updateDisplaySize(self):
+        display_size = QtCore.QSize(self._image_size)
+        if self.compare_mode == COMPARE_SIDE and display_size.isValid():
+            display_size.setWidth(display_size.width() * 2 + COMPARE_SPACING)
+        if display_size != self._display_size:
+            self._display_size = display_size
+            self.updateGeometry()
+
+    def setOverlay(self, overlay):
+        if overlay is not self.overlay:
+            self.overlay = overlay
+            self.update()
+
+    def displaySize(self):
+        return QtCore.QSize(self._image_size)
+
+    def setPainting(self, painting):
+        self.painting = painting
+        self._stroke = None
+        self.setCursor(QtCore.Qt.CrossCursor if painting else QtCore.Qt.ArrowCursor)
+
+    def mousePressEvent(self, event):
+        if self.painting and event.button() == QtCore.Qt.LeftButton and self.image is not None:
+            self._stroke = QtGui.QPolygonF([QtCore.QPointF(event.pos())])
+            event.accept()
+        elif self.compare_mode == COMPARE_WIPE and event.button() == QtCore.Qt.LeftButton and self.image is not None:
+            self._wiping = True
+            self.wipeTo(event.pos())
+            event.accept()
+        else:
+            QtWidgets.QWidget.mousePressEvent(self, event)
+
+    def mouseMoveEvent(self, event):
+        if self._stroke is not None:
+            self._stroke.append(QtCore.QPointF(event.pos()))
+            self.update()
+        elif self._wiping:
+            self.wipeTo(event.pos())
+        else:
+            QtWidgets.QWidget.mouseMoveEvent(self, event)
+
+    def mouseReleaseEvent(self, event):
+        if self._wiping:
+            self._wiping = False
+            return
+        if self._stroke is None:
+            return QtWidgets.QWidget.mouseReleaseEvent(self, event)
+        rect = self.imageRect()
+        points = []
+        for point in self._stroke:
+            points.append((point.x() - rect.x()) / float(rect.width()))
+            points.append((point.y() - rect.y()) / float(rect.height()))
+        self._stroke = None
+        self.strokeFinished.emit(points)
+        self.update()
+
+    def setSmooth(self, smooth):
+        if smooth != self.smooth:
+            self.smooth = smooth
+            if smooth and self.zoom != 1.0:
+                self.update()
+
+    def setHudText(self, text):
+        if text != self.hud_text:
+            self.hud_text = text
+            self.update()
+
+    def wipeTo(self, position):
+        rect = self.imageRect()
+        if rect.width() > 0:
+            self.setWipe((position.x() - rect.x()) / float(rect.width()))
+
+    def imageRect(self):
+        rect = QtCore.QRect(QtCore.QPoint(0, 0), self._display_size)
+        rect.moveCenter(self.rect().center())
+        rect.setSize(self._image_size)
+        return rect
+
+    def compareRect(self):
+        rect = self.imageRect()
+        if self.compare_mode == COMPARE_SIDE:
+            rect.translate(rect.width() + COMPARE_SPACING, 0)
+        return rect
+
+    def paintImage(self, painter, image, rect):
+        if image.size() == rect.size():
+            painter.drawImage(rect.topLeft(), image)
+        else:
+            painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform, self.smooth)
+            painter.drawImage(rect, image)
+
+    def paintEvent(self, event):
+        with profiling.timed('paint'):
+            painter = QtGui.QPainter(self)
+            painter.fillRect(event.rect(), self.palette().window())
+            if self.image is not None:
+                self.paintImage(painter, self.image, self.imageRect())
+                if self.compare_mode is not None and self.compare_image is not None:
+                    self.paintCompare(painter)
+                if self.overlay is not None:
+                    painter.drawImage(self.imageRect().topLeft(), self.overlay)
+            if self._stroke is not None:
+                painter.setRenderHint(QtGui.QPainter.Antialiasing)
+                painter.setPen(self.stroke_pen)
+                painter.drawPolyline(self._stroke)
+            if self.hud_text:
+                self.paintHud(painter)
+            painter.end()
+
+    def paintCompare(self, painter):
+        rect = self.compareRect()
+        if self.compare_mode == COMPARE_SIDE:
+            self.paintImage(painter, self.compare_image, rect)
+            return
+        x = rect.x() + int(round(rect.width() * self.wipe))
+        painter.save()
+        painter.setClipRect(QtCore.QRect(x, rect.y(), rect.right() - x + 1, rect.height()))
+        self.paintImage(painter, self.compare_image, rect)
+        painter.restore()
+        painter.setPen(QtGui.QColor(255, 255, 255))
+        painter.drawLine(x, rect.top(), x, rect.bottom())
+
+    def paintHud(self, painter):
+        painter.setFont(QtGui.QFont('Monospace', 9))
+        rect = painter.boundingRect(self.rect().adjusted(HUD_MARGIN, HUD_MARGIN, -HUD_MARGIN, -HUD_MARGIN),
+                                    QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop, self.hud_text)
+        painter.fillRect(rect.adjusted(-4, -2, 4, 2), QtGui.QColor(0, 0, 0, 160))
+        painter.setPen(QtGui.QColor(0, 255, 0))
+        painter.drawText(rect, QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop, self.hud_text)
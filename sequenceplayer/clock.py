@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player playback clock
+"""
+
+import collections
+import logging
+
+from PySide2 import QtCore
+
+logger = logging.getLogger(__name__)
+
+STATS_WINDOW_SECONDS = 1.0
+
+
+class PlaybackClock(QtCore.QObject):
+    tick = QtCore.Signal()
+
+    def __init__(self, fps=25.0, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.fps = fps
+        self._frames_anchor = 0
+        self._elapsed = QtCore.QElapsedTimer()
+        self._timer = QtCore.QTimer(self)
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self.tick.emit)
+        self.setFps(fps)
+
+    def isActive(self):
+        return self._timer.isActive()
+
+    def start(self):
+        self.restart()
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def restart(self):
+        self._frames_anchor = 0
+        self._elapsed.start()
+
+    def setFps(self, fps):
+        if self._elapsed.isValid():
+            self._frames_anchor = self.framesElapsed()
+            self._elapsed.start()
+        self.fps = max(0.01, fps)
+        self._timer.setInterval(max(1, int(round(1000.0 / self.fps))))
+
+    def elapsedMs(self):
+        return self._elapsed.nsecsElapsed() / 1000000.0 if self._elapsed.isValid() else 0.0
+
+    def framesElapsed(self):
+        # Wall clock based, so a slow frame makes the next tick skip ahead instead of drifting behind real time
+        return self._frames_anchor + int(self.elapsedMs() * self.fps / 1000.0)
+
+
+class PlaybackStats(object):
+    def __init__(self, window=STATS_WINDOW_SECONDS):
+        self.window = window
+        self.dropped = 0
+        self.shown = 0
+        self.latency_ms = 0.0
+        self._timer = QtCore.QElapsedTimer()
+        self._times = collections.deque()
+        self.reset()
+
+    def reset(self):
+        self.dropped = 0
+        self.shown = 0
+        self.latency_ms = 0.0
+        self._times.clear()
+        self._timer.start()
+
+    def frameShown(self, latency_ms, dropped=0):
+        now = self._timer.elapsed() / 1000.0
+        self._times.append(now)
+        while self._times and self._times[0] < now - self.window:
+            self._times.popleft()
+        self.shown += 1
+        self.dropped += max(0, dropped)
+        self.latency_ms = latency_ms
+
+    def fps(self):
+        if len(self._times) < 2:
+            return 0.0
+        duration = self._times[-1] - self._times[0]
+        return (len(self._times) - 1) / duration if duration > 0 else 0.0
+
+    def message(self, target_fps):
+        return '%.2f/%.2f fps, %d dropped, %.1f ms' % (self.fps(), target_fps, self.dropped, self.latency_ms)
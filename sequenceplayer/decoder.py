@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player process decode backend
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent import futures
+
+from PySide2 import QtGui
+
+import sequenceplayer.prefetch as prefetch
+import sequenceplayer.profiling as profiling
+import sequenceplayer.sequence as sequence
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+logger = logging.getLogger(__name__)
+
+DECODE_BACKENDS = prefetch.DECODE_BACKENDS
+
+
+def decodeShared(image_path, scale):
+    # Runs in a worker process, the pixels go back through a shared memory block the caller unlinks
+    image = sequence.readImage(image_path, scale)
+    if image is None:
+        return None
+    if image.colorCount():
+        # Only the pixels go back, indexed (GIF, palette PNG) and mono images would lose their colour table
+        image = image.convertToFormat(QtGui.QImage.Format_ARGB32 if image.hasAlphaChannel() else
+                                      QtGui.QImage.Format_RGB32)
+    block = shared_memory.SharedMemory(create=True, size=image.sizeInBytes())
+    try:
+        block.buf[:image.sizeInBytes()] = memoryview(image.constBits())[:image.sizeInBytes()]
+    finally:
+        block.close()
+    return block.name, image.width(), image.height(), image.bytesPerLine(), int(image.format())
+
+
+def createDecoder(backend='thread', workers=None):
+    if backend not in DECODE_BACKENDS:
+        raise ValueError('Unknown decode backend %r, expected one of %s' % (backend, ', '.join(DECODE_BACKENDS)))
+    if backend == 'thread':
+        return None
+    if shared_memory is None:
+        logger.warning('The process decode backend needs Python 3.8 or later, decoding in threads instead.')
+        return None
+    return ProcessDecoder(workers)
+
+
+# Decodes in a pool of worker processes so heavy formats are not serialized on the GIL, the prefetch threads that
+# call read() only wait on the result
+class ProcessDecoder(object):
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+
+    def executor(self):
+        if self._executor is None:
+            # Forking a process that already runs Qt threads is unsafe, workers always start fresh
+            self._executor = futures.ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def read(self, image_path, scale=1.0):
+        with profiling.timed('decode'):
+            try:
+                result = self.executor().submit(decodeShared, image_path, scale).result()
+            except (futures.BrokenExecutor, OSError, RuntimeError) as e:
+                logger.warning('Decode worker failed for %s, decoding in process: %s' % (image_path, e))
+                return sequence.readImage(image_path, scale)
+            if result is None:
+                return None
+            name, width, height, bytes_per_line, image_format = result
+            block = shared_memory.SharedMemory(name=name)
+            try:
+                image = QtGui.QImage(block.buf, width, height, bytes_per_line,
+                                     QtGui.QImage.Format(image_format)).copy()
+            finally:
+                block.close()
+                block.unlink()
+            return image
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player persistent proxy cache
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import threading
+
+from PySide2 import QtCore, QtGui
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISK_CACHE_MB = 4096
+EVICT_TO_RATIO = 0.9
+HEADER = struct.Struct('<4sIIII')
+MAGIC = b'SPC2'
+
+
+def defaultCacheDir():
+    location = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.GenericCacheLocation)
+    return os.path.join(location or QtCore.QDir.tempPath(), 'sequenceplayer')
+
+
+def cacheKey(image_path, size, mtime, level):
+    key = '%s|%d|%.6f|%s' % (os.path.abspath(image_path), size, mtime, level)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class WriteTask(QtCore.QRunnable):
+    def __init__(self, disk_cache, key, image):
+        QtCore.QRunnable.__init__(self)
+        self.setAutoDelete(True)
+        self.disk_cache = disk_cache
+        self.key = key
+        self.image = image
+
+    def run(self):
+        self.disk_cache.write(self.key, self.image)
+
+
+# Downscaled frames stored as raw pixels behind a small header, reading one back is a single read and no decode
+class DiskCache(QtCore.QObject):
+    def __init__(self, directory=None, max_bytes=DEFAULT_DISK_CACHE_MB * 1024 * 1024, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.directory = directory or defaultCacheDir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = None
+        self._lock = threading.Lock()
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.raw')
+
+    def contains(self, key):
+        return os.path.isfile(self.path(key))
+
+    def read(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, width, height, bytes_per_line, image_format = HEADER.unpack_from(data)
+        except (IOError, OSError, struct.error):
+            self.misses += 1
+            return None
+        if magic != MAGIC or len(data) != HEADER.size + bytes_per_line * height:
+            logger.debug('Discarding invalid cache entry %s' % path)
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # Touch so size-capped eviction drops least recently used entries first
+            os.utime(path, None)
+        except OSError:
+            pass
+        image = QtGui.QImage(memoryview(data)[HEADER.size:], width, height, bytes_per_line, QtGui.QImage.Format(image_format))
+        return image.copy()
+
+    def store(self, key, image):
+        if image is not None and not image.isNull():
+            self._pool.start(WriteTask(self, key, image))
+
+    def write(self, key, image):
+        path = self.path(key)
+        header = HEADER.pack(MAGIC, image.width(), image.height(), image.bytesPerLine(), int(image.format()))
+        temp_path = '%s.%d.tmp' % (path, threading.current_thread().ident)
+        previous_size = os.path.getsize(path) if os.path.isfile(path) else 0
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(temp_path, 'wb') as f:
+                f.write(header)
+                f.write(bytes(image.constBits()))
+            os.replace(temp_path, path)
+        except (IOError, OSError) as e:
+            logger.warning('Could not write cache entry %s: %s' % (path, e))
+            self._remove(temp_path)
+            return
+        self._added(os.path.getsize(path) - previous_size)
+
+    def wait(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
+
+    def entries(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for folder in os.listdir(self.directory):
+            folder = os.path.join(self.directory, folder)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith('.raw'):
+                    path = os.path.join(folder, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            self._remove(path)
+        with self._lock:
+            self._bytes = 0
+
+    def _added(self, size):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(entry[1] for entry in self.entries())
+            else:
+                self._bytes += size
+            if self._bytes <= self.max_bytes:
+                return
+            for mtime, size, path in sorted(self.entries()):
+                if self._bytes <= self.max_bytes * EVICT_TO_RATIO:
+                    break
+                if self._remove(path):
+                    self._bytes -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
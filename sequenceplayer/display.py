@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player display transform
+"""
+
+import importlib.util
+import logging
+import os
+
+from PySide2 import QtGui
+
+import sequenceplayer.cache as cache
+import sequenceplayer.profiling as profiling
+
+# Imported with the first transform that is not identity, playing images unchanged never loads it
+numpy = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISPLAY_CACHE_MB = 512
+DISPLAY_NAMESPACE = 'display'
+ENCODE_TABLE_SIZE = 4096
+
+
+def isAvailable():
+    return numpy is not None or importlib.util.find_spec('numpy') is not None
+
+
+def importNumpy():
+    global numpy
+    if numpy is None and isAvailable():
+        with profiling.timed('import_numpy'):
+            import numpy
+    return numpy
+
+
+def srgbToLinear(values):
+    return numpy.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def linearToSrgb(values):
+    values = numpy.clip(values, 0.0, 1.0)
+    return numpy.where(values <= 0.0031308, values * 12.92, 1.055 * values ** (1.0 / 2.4) - 0.055)
+
+
+def imageToArray(image):
+    # Float RGBA in [0, 1] as stored in the file (display encoded), 16 bit images keep their precision
+    if image.depth() > 32:
+        image = image.convertToFormat(QtGui.QImage.Format_RGBA64)
+        dtype, maximum = numpy.uint16, 65535.0
+    else:
+        image = image.convertToFormat(QtGui.QImage.Format_RGBA8888)
+        dtype, maximum = numpy.uint8, 255.0
+    pixels = numpy.frombuffer(image.constBits(), dtype, image.bytesPerLine() * image.height() // dtype().itemsize)
+    pixels = pixels.reshape(image.height(), image.bytesPerLine() // dtype().itemsize)[:, :image.width() * 4]
+    # Copied, the converted image and the buffer it owns go away on return
+    return pixels.reshape(image.height(), image.width(), 4).copy(), maximum
+
+
+def arrayToImage(pixels):
+    pixels = numpy.ascontiguousarray(pixels, numpy.uint8)
+    height, width = pixels.shape[:2]
+    return QtGui.QImage(pixels.data, width, height, width * 4, QtGui.QImage.Format_RGBA8888).copy()
+
+
+def readCubeLut(path):
+    importNumpy()
+    size = None
+    dimensions = None
+    domain_min = numpy.zeros(3, numpy.float32)
+    domain_max = numpy.ones(3, numpy.float32)
+    values = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#') or fields[0] == 'TITLE':
+                continue
+            if fields[0] in ('LUT_1D_SIZE', 'LUT_3D_SIZE'):
+                size = int(fields[1])
+                dimensions = 1 if fields[0] == 'LUT_1D_SIZE' else 3
+            elif fields[0] == 'DOMAIN_MIN':
+                domain_min = numpy.array(fields[1:4], numpy.float32)
+            elif fields[0] == 'DOMAIN_MAX':
+                domain_max = numpy.array(fields[1:4], numpy.float32)
+            else:
+                values.append(fields[:3])
+    if size is None or len(values) != size ** dimensions:
+        raise ValueError('%s is not a valid .cube LUT' % path)
+    table = numpy.array(values, numpy.float32)
+    if dimensions == 3:
+        # Red varies fastest in .cube files, index as table[blue, green, red]
+        table = table.reshape(size, size, size, 3)
+    return Lut(table, dimensions, domain_min, domain_max, path)
+
+
+class Lut(object):
+    def __init__(self, table, dimensions, domain_min, domain_max, path=None):
+        self.table = table
+        self.dimensions = dimensions
+        self.domain_min = domain_min
+        self.domain_max = domain_max
+        self.path = path
+
+    def apply(self, rgb):
+        size = self.table.shape[0]
+        position = (rgb - self.domain_min) / (self.domain_max - self.domain_min) * (size - 1)
+        position = numpy.clip(position, 0, size - 1)
+        if self.dimensions == 1:
+            index = numpy.minimum(position.astype(numpy.int32), size - 2)
+            fraction = position - index
+            channels = numpy.arange(3)
+            return self.table[index, channels] * (1 - fraction) + self.table[index + 1, channels] * fraction
+        index = numpy.minimum(position.astype(numpy.int32), size - 2)
+        fraction = position - index
+        r, g, b = index[..., 0], index[..., 1], index[..., 2]
+        fr, fg, fb = fraction[..., 0:1], fraction[..., 1:2], fraction[..., 2:3]
+        # Trilinear interpolation between the eight surrounding lattice points
+        c00 = self.table[b, g, r] * (1 - fr) + self.table[b, g, r + 1] * fr
+        c01 = self.table[b + 1, g, r] * (1 - fr) + self.table[b + 1, g, r + 1] * fr
+        c10 = self.table[b, g + 1, r] * (1 - fr) + self.table[b, g + 1, r + 1] * fr
+        c11 = self.table[b + 1, g + 1, r] * (1 - fr) + self.table[b + 1, g + 1, r + 1] * fr
+        c0 = c00 * (1 - fg) + c10 * fg
+        c1 = c01 * (1 - fg) + c11 * fg
+        return c0 * (1 - fb) + c1 * fb
+
+
+# Exposure in stops on linear light, then sRGB encoding, an optional .cube display LUT and a final gamma. Only the
+# image at on-screen resolution is transformed, results are cached per frame, level and settings so changing the
+# settings during looped playback never decodes again and going back to earlier settings is free
+class DisplayTransform(object):
+    def __init__(self, frame_cache=None, max_bytes=DEFAULT_DISPLAY_CACHE_MB * 1024 * 1024):
+        self.exposure = 0.0
+        self.gamma = 1.0
+        self.lut = None
+        self.cache = frame_cache if frame_cache is not None else cache.FrameCache(max_bytes=max_bytes)
+        self._namespaces = set()
+        self._tables = {}
+
+    def isIdentity(self):
+        return self.exposure == 0.0 and self.gamma == 1.0 and self.lut is None
+
+    def settings(self):
+        return self.exposure, self.gamma, self.lut.path if self.lut is not None else None
+
+    def setExposure(self, exposure):
+        self.exposure = float(exposure)
+
+    def setGamma(self, gamma):
+        self.gamma = max(0.01, float(gamma))
+
+    def setLut(self, path=None):
+        if path:
+            self.lut = readCubeLut(path)
+            logger.info('Loaded %dD display LUT %s' % (self.lut.dimensions, os.path.basename(path)))
+        else:
+            self.lut = None
+        self.clear()
+
+    def reset(self):
+        self.exposure = 0.0
+        self.gamma = 1.0
+        self.setLut(None)
+
+    def cacheNamespace(self, namespace=None):
+        return DISPLAY_NAMESPACE, namespace
+
+    def clear(self):
+        for namespace in self._namespaces:
+            self.cache.discardNamespace(namespace)
+        self._namespaces.clear()
+
+    def discardFrames(self, frames, namespace=None):
+        for frame in frames:
+            self.cache.discardFrame(frame, self.cacheNamespace(namespace))
+
+    def decodeTable(self, maximum):
+        # Integer code value to linear light, one lookup per pixel instead of a power per pixel
+        if maximum not in self._tables:
+            self._tables[maximum] = srgbToLinear(numpy.arange(int(maximum) + 1, dtype=numpy.float32) / maximum)
+        return self._tables[maximum]
+
+    def encodeTable(self):
+        key = ('encode', self.gamma, self.lut is None)
+        if key not in self._tables:
+            values = linearToSrgb(numpy.linspace(0.0, 1.0, ENCODE_TABLE_SIZE, dtype=numpy.float32))
+            if self.lut is None and self.gamma != 1.0:
+                values = values ** (1.0 / self.gamma)
+            self._tables[key] = values.astype(numpy.float32)
+        return self._tables[key]
+
+    def transform(self, image):
+        pixels, maximum = imageToArray(image)
+        rgb = self.decodeTable(maximum)[pixels[..., :3]] * numpy.float32(2.0 ** self.exposure)
+        index = numpy.clip(rgb * (ENCODE_TABLE_SIZE - 1) + 0.5, 0, ENCODE_TABLE_SIZE - 1).astype(numpy.int32)
+        rgb = self.encodeTable()[index]
+        if self.lut is not None:
+            rgb = self.lut.apply(rgb)
+            if self.gamma != 1.0:
+                rgb = numpy.clip(rgb, 0.0, 1.0) ** (1.0 / self.gamma)
+        result = numpy.empty(pixels.shape, numpy.uint8)
+        result[..., :3] = numpy.clip(rgb * 255.0 + 0.5, 0, 255)
+        result[..., 3] = pixels[..., 3] * (255.0 / maximum) if maximum != 255.0 else pixels[..., 3]
+        return arrayToImage(result)
+
+    def apply(self, frame, level, image, namespace=None):
+        if image is None or self.isIdentity() or importNumpy() is None:
+            return image
+        key = cache.frameKey(frame, (level, self.settings()), self.cacheNamespace(namespace))
+        result = self.cache.get(key)
+        if result is None:
+            with profiling.timed('display_transform'):
+                result = self.transform(image)
+            if key[2] not in self._namespaces:
+                self.cache.follow(key[2], namespace)
+                self._namespaces.add(key[2])
+            self.cache.put(key, result)
+        return result
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player headless export
+
+python -m sequenceplayer --input render.1001.exr --export proxy/render.#.jpg --export-scale 0.5
+python -m sequenceplayer --input render.1001.exr --export sheets/render_sheet.#.jpg --contact-sheet
+"""
+
+import collections
+import logging
+import os
+import time
+from concurrent import futures
+
+from PySide2 import QtCore, QtGui
+
+import sequenceplayer.cache as cache
+import sequenceplayer.sequence as sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPORT_SCALE = sequence.PROXY_SCALE
+DEFAULT_COLUMNS = 6
+DEFAULT_ROWS = 5
+DEFAULT_TILE_WIDTH = 320
+SHEET_SPACING = 8
+SHEET_LABEL_HEIGHT = 18
+
+
+def openSequence(file_path):
+    sequence_path, digits, frame = sequence.parseSequencePath(file_path)
+    if sequence_path is None:
+        raise ValueError('%s is not part of an image sequence' % file_path)
+    # Nothing is kept in memory, frames only pass through the pipeline
+    image_sequence = sequence.Sequence(frame_cache=cache.FrameCache(max_bytes=0))
+    image_sequence.setPath(sequence_path, digits)
+    return image_sequence
+
+
+def selectFrames(image_sequence, first=None, last=None, step=1):
+    frames = [frame for frame in image_sequence.index.frames()
+              if (first is None or frame >= first) and (last is None or frame <= last)]
+    return frames[::max(1, step)]
+
+
+def outputPath(pattern, number, digits=4):
+    if '#' not in pattern:
+        root, extension = os.path.splitext(pattern)
+        pattern = '%s.#%s' % (root, extension)
+    # Named like the player names frames, negative frames export as -0001 and open again as part of the sequence
+    return sequence.framePath(pattern, digits, number)
+
+
+def orderedMap(function, items, workers):
+    # At most two tasks per worker are in flight, memory stays bounded however long the sequence is
+    window = collections.deque()
+    with futures.ThreadPoolExecutor(workers) as executor:
+        for item in items:
+            window.append(executor.submit(function, item))
+            if len(window) >= workers * 2:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def thumbnailScale(image_path, width):
+    size = QtGui.QImageReader(image_path).size()
+    return min(1.0, float(width) / size.width()) if size.isValid() and size.width() > 0 else 1.0
+
+
+def readFrame(image_path, scale, decoder=None):
+    if decoder is not None:
+        return decoder.read(image_path, scale)
+    return sequence.readImage(image_path, scale)
+
+
+def exportProxies(image_sequence, frames, output, scale=DEFAULT_EXPORT_SCALE, workers=None, decoder=None,
+                  quality=-1):
+    def writeProxy(frame):
+        sequence_frame = image_sequence.getFrame(frame)
+        image = readFrame(sequence_frame.image_path, scale, decoder)
+        path = outputPath(output, frame, image_sequence.digits)
+        if image is None or not image.save(path, None, quality):
+            logger.warning('Could not export frame %d to %s' % (frame, path))
+            return frame, None
+        return frame, path
+
+    return orderedMap(writeProxy, frames, workers or os.cpu_count() or 1)
+
+
+def renderSheet(thumbnails, columns, tile_width):
+    tile_height = max(image.height() for frame, image in thumbnails if image is not None)
+    rows = (len(thumbnails) + columns - 1) // columns
+    sheet = QtGui.QImage(columns * (tile_width + SHEET_SPACING) + SHEET_SPACING,
+                         rows * (tile_height + SHEET_LABEL_HEIGHT + SHEET_SPACING) + SHEET_SPACING,
+                         QtGui.QImage.Format_RGB32)
+    sheet.fill(QtGui.QColor(32, 32, 32))
+    painter = QtGui.QPainter(sheet)
+    painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+    painter.setPen(QtGui.QColor(220, 220, 220))
+    for position, (frame, image) in enumerate(thumbnails):
+        x = SHEET_SPACING + (position % columns) * (tile_width + SHEET_SPACING)
+        y = SHEET_SPACING + (position // columns) * (tile_height + SHEET_LABEL_HEIGHT + SHEET_SPACING)
+        if image is not None:
+            painter.drawImage(x + (tile_width - image.width()) // 2, y + (tile_height - image.height()) // 2, image)
+        painter.drawText(QtCore.QRect(x, y + tile_height, tile_width, SHEET_LABEL_HEIGHT), QtCore.Qt.AlignCenter,
+                         str(frame))
+    painter.end()
+    return sheet
+
+
+def exportContactSheets(image_sequence, frames, output, columns=DEFAULT_COLUMNS, rows=DEFAULT_ROWS,
+                        tile_width=DEFAULT_TILE_WIDTH, workers=None, decoder=None, quality=-1):
+    def readThumbnail(frame):
+        image_path = image_sequence.getFrame(frame).image_path
+        image = readFrame(image_path, thumbnailScale(image_path, tile_width), decoder)
+        if image is not None and image.width() > tile_width:
+            image = image.scaledToWidth(tile_width, QtCore.Qt.SmoothTransformation)
+        return frame, image
+
+    thumbnails = []
+    sheet_number = 1
+    for thumbnail in orderedMap(readThumbnail, frames, workers or os.cpu_count() or 1):
+        thumbnails.append(thumbnail)
+        if len(thumbnails) == columns * rows:
+            yield writeSheet(thumbnails, columns, tile_width, outputPath(output, sheet_number), quality)
+            thumbnails = []
+            sheet_number += 1
+    if thumbnails:
+        yield writeSheet(thumbnails, columns, tile_width, outputPath(output, sheet_number), quality)
+
+
+def writeSheet(thumbnails, columns, tile_width, path, quality=-1):
+    frames = [frame for frame, image in thumbnails]
+    if all(image is None for frame, image in thumbnails):
+        logger.warning('No readable frames between %d and %d, skipping %s' % (frames[0], frames[-1], path))
+        return frames, None
+    if not renderSheet(thumbnails, columns, tile_width).save(path, None, quality):
+        logger.warning('Could not write contact sheet %s' % path)
+        return frames, None
+    return frames, path
+
+
+def option(args, name, default):
+    # The command line leaves export options unset, its parser is built without importing this module
+    value = getattr(args, name, None)
+    return default if value is None else value
+
+
+def run(args, decoder=None):
+    sequence.addImageFormatsSupport()
+    image_sequence = openSequence(args.input)
+    frames = selectFrames(image_sequence, args.first, args.last, args.step)
+    directory = os.path.dirname(os.path.abspath(args.export))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    started = time.time()
+    written = 0
+    failed = 0
+    if args.contact_sheet:
+        results = exportContactSheets(image_sequence, frames, args.export, option(args, 'columns', DEFAULT_COLUMNS),
+                                      option(args, 'rows', DEFAULT_ROWS),
+                                      option(args, 'tile_width', DEFAULT_TILE_WIDTH), args.export_workers, decoder,
+                                      args.quality)
+    else:
+        results = exportProxies(image_sequence, frames, args.export, option(args, 'export_scale', DEFAULT_EXPORT_SCALE),
+                                args.export_workers, decoder, args.quality)
+    for done, path in results:
+        if path:
+            written += 1
+            logger.info('Wrote %s' % path)
+        else:
+            failed += 1
+    return written, failed, time.time() - started
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player file reads
+"""
+
+import collections
+import logging
+import threading
+import time
+from concurrent import futures
+
+import sequenceplayer.profiling as profiling
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IO_WORKERS = 16
+DEFAULT_READ_AHEAD_FILES = 32
+
+
+# Reads whole files on a thread pool so the open and read round trips of a network filesystem overlap instead of
+# running one after the other in front of each decode. Files read ahead are held until the decode picks them up, the
+# oldest are dropped once more than max_files are waiting. A file that cannot be opened reads as None, there is no
+# separate stat beforehand
+class FileReader(object):
+    def __init__(self, workers=DEFAULT_IO_WORKERS, max_files=DEFAULT_READ_AHEAD_FILES):
+        self.workers = workers
+        self.max_files = max_files
+        self.reads = 0
+        self.failures = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.dropped = 0
+        self._buffered = collections.OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(self.workers, thread_name_prefix='FileReader')
+        return self._executor
+
+    def readFile(self, path):
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError) as e:
+            logger.debug('Could not read %s: %s' % (path, e))
+            data = None
+        duration = time.perf_counter() - started
+        profiling.PROFILER.add('file_read', duration * 1000.0)
+        with self._lock:
+            self.reads += 1
+            self.busy += duration
+            if data is None:
+                self.failures += 1
+            else:
+                self.bytes += len(data)
+        return data
+
+    def prefetch(self, path):
+        with self._lock:
+            if path in self._buffered:
+                return False
+            self._buffered[path] = self.executor().submit(self.readFile, path)
+            while len(self._buffered) > self.max_files:
+                self._buffered.popitem(last=False)[1].cancel()
+                self.dropped += 1
+        return True
+
+    def read(self, path):
+        with self._lock:
+            future = self._buffered.pop(path, None)
+        if future is not None and not future.cancelled():
+            # Ideally already done, the wait is what the decode still loses to I/O
+            with profiling.timed('file_wait'):
+                return future.result()
+        return self.readFile(path)
+
+    def cancel(self):
+        with self._lock:
+            for future in self._buffered.values():
+                future.cancel()
+            self._buffered.clear()
+
+    def shutdown(self):
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self):
+        read = profiling.PROFILER.stats('file_read')
+        wait = profiling.PROFILER.stats('file_wait')
+        with self._lock:
+            return {'reads': self.reads,
+                    'failures': self.failures,
+                    'bytes': self.bytes,
+                    'buffered': len(self._buffered),
+                    'dropped': self.dropped,
+                    # Per read stream, the pool runs up to workers of them at once
+                    'mb_per_s': self.bytes / 1048576.0 / self.busy if self.busy else 0.0,
+                    'latency_p50_ms': read['p50_ms'],
+                    'latency_p95_ms': read['p95_ms'],
+                    'wait_p95_ms': wait['p95_ms']}
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player memory-mapped loop cache
+"""
+
+import logging
+import mmap
+import os
+import tempfile
+import threading
+
+from PySide2 import QtCore, QtGui
+
+import sequenceplayer.diskcache as diskcache
+
+logger = logging.getLogger(__name__)
+
+LOOP_CACHE_FORMAT = QtGui.QImage.Format_RGBA8888
+BYTES_PER_PIXEL = 4
+
+
+class BakeTask(QtCore.QRunnable):
+    def __init__(self, loop_cache, frames, generation):
+        QtCore.QRunnable.__init__(self)
+        self.setAutoDelete(True)
+        self.loop_cache = loop_cache
+        self.frames = frames
+        self.generation = generation
+
+    def run(self):
+        self.loop_cache.bakeFrames(self.frames, self.generation)
+
+
+# A QImage over part of the mapping that keeps its memoryview, closing the mapping then fails with BufferError until
+# the last image over it is gone. PySide2 does not keep the buffer a QImage is constructed from referenced by itself
+class MappedImage(QtGui.QImage):
+    def __init__(self, buffer, size):
+        QtGui.QImage.__init__(self, buffer, size.width(), size.height(), size.width() * BYTES_PER_PIXEL,
+                              LOOP_CACHE_FORMAT)
+        self.buffer = buffer
+
+
+# Bakes a loop range into one file of uncompressed RGBA frames and serves QImages that point straight into the
+# mapping, looping then never decodes or copies and the OS page cache decides what stays in memory
+class LoopCache(QtCore.QObject):
+    progress = QtCore.Signal(int, int)
+
+    def __init__(self, directory=None, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.directory = directory or diskcache.defaultCacheDir()
+        self.first = None
+        self.last = None
+        self.level = None
+        self.size = None
+        self._file = None
+        self._map = None
+        self._baked = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+    def isActive(self):
+        return self._map is not None
+
+    def matches(self, first, last, level):
+        return self.isActive() and (self.first, self.last, self.level) == (first, last, level)
+
+    def contains(self, frame, level):
+        with self._lock:
+            return level == self.level and frame in self._baked
+
+    def discardFrames(self, frames):
+        with self._lock:
+            self._baked.difference_update(frames)
+
+    def frameBytes(self):
+        return self.size.width() * self.size.height() * BYTES_PER_PIXEL
+
+    def bake(self, image_sequence, first, last, level):
+        self.release()
+        frames = [image_sequence.getFrame(frame) for frame in range(first, last + 1)]
+        sample = None
+        for sequence_frame in frames:
+            sample = sequence_frame.getImageScaled(*level) if sequence_frame else None
+            if sample:
+                break
+        if not sample:
+            logger.warning('Nothing to bake between frames %d and %d.' % (first, last))
+            return False
+        self.first, self.last, self.level, self.size = first, last, level, sample.size()
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            self._file = tempfile.TemporaryFile(prefix='loop', dir=self.directory)
+            self._file.truncate(self.frameBytes() * len(frames))
+            self._map = mmap.mmap(self._file.fileno(), self.frameBytes() * len(frames))
+        except (IOError, OSError, ValueError) as e:
+            logger.warning('Could not create loop cache in %s: %s' % (self.directory, e))
+            self.release()
+            return False
+        self._pool.start(BakeTask(self, frames, self._generation))
+        return True
+
+    def bakeFrames(self, frames, generation):
+        for position, sequence_frame in enumerate(frames):
+            if generation != self._generation:
+                return
+            image = None
+            if sequence_frame is not None:
+                image = sequence_frame.frame_cache.peek(sequence_frame.cacheKey(self.level))
+                if image is None:
+                    image = sequence_frame.decodeImage(self.level)
+            if image is None:
+                continue
+            if image.size() != self.size:
+                image = image.scaled(self.size, QtCore.Qt.IgnoreAspectRatio)
+            image = image.convertToFormat(LOOP_CACHE_FORMAT)
+            offset = position * self.frameBytes()
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._map[offset:offset + self.frameBytes()] = memoryview(image.constBits())[:self.frameBytes()]
+                self._baked.add(sequence_frame.frame)
+            self.progress.emit(len(self._baked), len(frames))
+
+    def image(self, frame):
+        with self._lock:
+            if frame not in self._baked:
+                return None
+            offset = (frame - self.first) * self.frameBytes()
+            buffer = memoryview(self._map)[offset:offset + self.frameBytes()]
+        return MappedImage(buffer, self.size)
+
+    def release(self):
+        with self._lock:
+            self._generation += 1
+            self._baked = set()
+        self._pool.waitForDone()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Still displayed, the mapping goes away with the last image that uses it
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.first = self.last = self.level = self.size = None
@@ -4,60 +4,173 @@
 Sequence player main window
 """
 
-import glob
 import logging
 import os
-import re
 
 from PySide2 import QtCore, QtWidgets
-from PySide2.QtUiTools import QUiLoader
 
 
+import sequenceplayer.annotations as annotations
+import sequenceplayer.cache as cache
 import sequenceplayer.canvas as canvas
+import sequenceplayer.clock as clock
+import sequenceplayer.diskcache as diskcache
+import sequenceplayer.display as display
+import sequenceplayer.fileio as fileio
+import sequenceplayer.loopcache as loopcache
+import sequenceplayer.playlist as playlist
+import sequenceplayer.prefetch as prefetch
+import sequenceplayer.profiling as profiling
 import sequenceplayer.sequence as sequence
+import sequenceplayer.watcher as watcher
 
 logger = logging.getLogger(__name__)
 
-LIVE_UPDATE_INTERVAL_SECONDS = 1.0
+LIVE_UPDATE_INTERVAL_SECONDS = watcher.POLL_INTERVAL_SECONDS
+LIVE_UPDATE_WATCHED_INTERVAL_SECONDS = watcher.WATCHED_POLL_INTERVAL_SECONDS
+SCRUB_SETTLE_MSECS = 150
+COMPARE_NAMESPACE = 'compare'
 
 
 class SequencePlayer(QtWidgets.QMainWindow):
-    def __init__(self, file_path=None, fps=25.0, live_update=False, parent=None):
+    def __init__(self, file_path=None, fps=25.0, live_update=False, cache_mb=cache.DEFAULT_CACHE_MB, cache_frames=None,
+                 prefetch_workers=prefetch.DEFAULT_PREFETCH_WORKERS, prefetch_depth=prefetch.DEFAULT_PREFETCH_DEPTH,
+                 play_every_frame=False, proxy=False, disk_cache_dir=None,
+                 disk_cache_mb=diskcache.DEFAULT_DISK_CACHE_MB, loop_cache=False, hud=False, profile_path=None,
+                 decode_backend='thread', decode_workers=None, exposure=0.0, gamma=1.0, lut_path=None,
+                 compare_path=None, compare_mode=canvas.COMPARE_WIPE, io_workers=fileio.DEFAULT_IO_WORKERS,
+                 playlist_paths=None, server_name=None, parent=None):
         super(SequencePlayer, self).__init__(parent)
         self._image_scale = 1
-        self._list_update_latest = None
-        self._live_update_timer = QtCore.QTimer()
-        self._live_update_timer.setInterval(LIVE_UPDATE_INTERVAL_SECONDS * 1000)
-        self._playback_timer = QtCore.QTimer()
+        self._proxy = proxy
+        self._playback_direction = 1
+        self._playback_clock = clock.PlaybackClock(fps, self)
+        self._playback_stats = clock.PlaybackStats()
+        self._playback_anchor = None
+        self._playback_shown = 0
+        self._play_every_frame = play_every_frame
+        self._playback_waiting = None
         self._recent_browser_path = None
-        self._sequence = sequence.Sequence(self)
+        self._disk_cache = None
+        if disk_cache_mb > 0:
+            self._disk_cache = diskcache.DiskCache(disk_cache_dir, int(disk_cache_mb * 1024 * 1024), self)
+        self._decoder = None
+        if decode_backend != 'thread':
+            # Multiprocessing is only imported when decoding in worker processes
+            import sequenceplayer.decoder as decoder
+            self._decoder = decoder.createDecoder(decode_backend, decode_workers)
+        self._file_reader = fileio.FileReader(io_workers) if io_workers > 0 else None
+        self._sequence = sequence.Sequence(self, frame_cache=cache.FrameCache(max_bytes=int(cache_mb * 1024 * 1024),
+                                                                           max_frames=cache_frames),
+                                           disk_cache=self._disk_cache, decoder=self._decoder,
+                                           file_reader=self._file_reader)
+        # The compare sequence shares the frame cache, both draw on one memory budget
+        self._compare = sequence.Sequence(self, frame_cache=self._sequence.frame_cache, disk_cache=self._disk_cache,
+                                          decoder=self._decoder, file_reader=self._file_reader,
+                                          namespace=COMPARE_NAMESPACE)
+        self._compare_mode = compare_mode
+        self._compare_offset = 0
+        # Shots of a playlist keep their frames in the shared cache under their path, the next shot is warmed into it
+        self._playlist = playlist.Playlist(playlist_paths)
+        self._warm = sequence.Sequence(self, frame_cache=self._sequence.frame_cache, disk_cache=self._disk_cache,
+                                       decoder=self._decoder, file_reader=self._file_reader)
+        # Prefetch generation the next shot was queued in per path and level, queued again only once that was cancelled
+        self._warmed = {}
+        if not file_path:
+            file_path = self._playlist.current()
+        if self._decoder is not None and prefetch_workers > 0:
+            # Prefetch threads only wait on the decode processes, one per process keeps them all busy
+            prefetch_workers = max(prefetch_workers, self._decoder.workers)
+        self._prefetcher = prefetch.FramePrefetcher(self._sequence, workers=prefetch_workers, depth=prefetch_depth,
+                                                    parent=self)
+        self._live_update_watcher = watcher.SequenceWatcher(self._sequence, LIVE_UPDATE_INTERVAL_SECONDS, self)
+        self._loop_cache = loopcache.LoopCache(disk_cache_dir, self)
+        self._loop_cache_enabled = loop_cache
+        self._loop_bake_timer = QtCore.QTimer(self)
+        self._loop_bake_timer.setSingleShot(True)
+        self._loop_bake_timer.setInterval(500)
+        # Display transform results and annotation layers draw on the frame cache budget too
+        self._display = display.DisplayTransform(self._sequence.frame_cache)
+        self._display.setExposure(exposure)
+        self._display.setGamma(gamma)
+        if lut_path:
+            self.loadLut(lut_path)
+        if not display.isAvailable() and not self._display.isIdentity():
+            logger.warning('Exposure, gamma and display LUTs need numpy, showing images unchanged.')
+        self._annotations = annotations.AnnotationStore(self)
+        self._annotation_overlay = annotations.AnnotationOverlay(self._annotations, self._sequence.frame_cache)
+        self._annotations_visible = True
+        self._preloaded_path = None
+        self._scrub_position = None
+        self._scrub_requested = None
+        self._refine_frame = None
+        self._scrub_timer = QtCore.QTimer(self)
+        self._scrub_timer.setSingleShot(True)
+        self._scrub_timer.setInterval(0)
+        self._scrub_settle_timer = QtCore.QTimer(self)
+        self._scrub_settle_timer.setSingleShot(True)
+        self._scrub_settle_timer.setInterval(SCRUB_SETTLE_MSECS)
+        self._hud = hud
+        self._hud_timer = QtCore.QTimer(self)
+        self._hud_timer.setInterval(500)
+        self._profile_path = profile_path
+        if profile_path:
+            profiling.PROFILER.startTrace()
+        if file_path:
+            # The first frame decodes in the background while the window is built
+            self.preloadFrame(file_path)
+        profiling.STARTUP.lap('setup')
         self.loadUi()
+        profiling.STARTUP.lap('ui')
         self.loadSettings()
         self.populateMenu()
         self.wireSignals()
         self.ui.spinbox_fps.setValue(fps)
         self.setPlaybackSpeed()
         self.installEventFilter(self)
+        self._server = None
+        if server_name:
+            # QtNetwork is only loaded for a player that takes remote commands
+            import sequenceplayer.remote as remote
+            self._server = remote.RemoteServer(self, self)
+            self._server.listen(server_name)
+        profiling.STARTUP.lap('menus')
         if file_path:
             self.loadSequence(file_path)
+            profiling.STARTUP.lap('sequence')
+            if compare_path:
+                self.loadCompare(compare_path)
             if live_update:
                 self.ui.checkbox_live_update.setChecked(True)
             self.playbackStart()
+        elif not profiling.STARTUP.finished:
+            logger.info('Startup: %s' % profiling.STARTUP.finish('window'))
+
+    def preloadFrame(self, file_path):
+        sequence_path, frame_digits, frame = sequence.parseSequencePath(file_path)
+        if sequence_path is not None and frame is not None:
+            self.setSequencePath(sequence_path, frame_digits)
+            self._preloaded_path = sequence_path
+            self._prefetcher.setLevel(self.imageLevel())
+            self._prefetcher.enqueue(frame)
 
     def loadUi(self):
         self.setWindowTitle('Sequence Player')
         ui_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mainwindow.ui')
         if os.path.isfile(ui_path):
+            # QtUiTools is only needed here, importing it with the package slows down every tool that imports us
+            from PySide2.QtUiTools import QUiLoader
             loader = QUiLoader()
             self.ui = loader.load(ui_path)
-            self.ui.checkbox_live_update.setToolTip('Check for new sequence files every %.1f seconds' %
-                                                    LIVE_UPDATE_INTERVAL_SECONDS +\
-                                                    '(auto-disabled after 1 minute)')
+            self.ui.checkbox_live_update.setToolTip('Watch the sequence directory for new files (polled every %.1f '
+                                                    'seconds where it cannot be watched, every %.1f seconds for '
+                                                    'files written by other hosts)' %
+                                                    (LIVE_UPDATE_INTERVAL_SECONDS,
+                                                     LIVE_UPDATE_WATCHED_INTERVAL_SECONDS))
             self.setCentralWidget(self.ui)
             self.image_canvas = canvas.ImageCanvas(self)
             self.image_canvas.setFocusPolicy(QtCore.Qt.StrongFocus)
-            self.image_canvas.setAlignment(QtCore.Qt.AlignCenter)
-            self.ui.frame_canvas.layout().insertWidget(0, self.image_canvas)
+            self.ui.frame_canvas.layout().addWidget(self.image_canvas)
             self.statusBar().showMessage('No sequence loaded.', 0)
         else:
             logger.critical('UI file not found: %s' % ui_path)
@@ -65,8 +178,10 @@ class SequencePlayer(QtWidgets.QMainWindow):
     def wireSignals(self):
         self.ui.spinbox_now.valueChanged.connect(lambda: self.setTimelineFrame(self.ui.spinbox_now.value()))
         self.ui.timeline_slider.valueChanged.connect(lambda: self.ui.spinbox_now.setValue(self.timelineFrame()))
-        self.ui.timeline_slider.valueChanged.connect(self.updateImage)
+        self.ui.timeline_slider.valueChanged.connect(self.timelineChanged)
         self.ui.timeline_slider.actionTriggered.connect(self.playbackStop)
+        self.ui.timeline_slider.sliderPressed.connect(self._prefetcher.cancel)
+        self.ui.timeline_slider.sliderReleased.connect(self.scrubSettle)
         self.ui.spinbox_start.editingFinished.connect(self.updateRanges)
         self.ui.spinbox_end.editingFinished.connect(self.updateRanges)
         self.ui.spinbox_fps.valueChanged.connect(self.setPlaybackSpeed)
@@ -82,46 +197,375 @@ class SequencePlayer(QtWidgets.QMainWindow):
         self.ui.button_annotations_next.clicked.connect(self.annotationsNext)
         self.ui.button_toend.clicked.connect(self.playbackStop)
         self.ui.button_toend.clicked.connect(self.frameToEnd)
-        self._playback_timer.timeout.connect(self.frameIncrement)
-        self._live_update_timer.timeout.connect(self.liveUpdate)
+        self._playback_clock.tick.connect(self.playbackTick)
+        self._prefetcher.frameReady.connect(self.playbackFrameReady)
+        self._live_update_watcher.rangeChanged.connect(self.liveUpdate)
+        self._loop_bake_timer.timeout.connect(self.bakeLoop)
+        self._hud_timer.timeout.connect(self.updateHud)
+        self._scrub_timer.timeout.connect(self.scrubUpdate)
+        self._scrub_settle_timer.timeout.connect(self.scrubSettle)
+        self._loop_cache.progress.connect(self.bakeLoopProgress)
+        self._sequence.cleared.connect(self._loop_cache.release)
+        self._sequence.cleared.connect(self._display.clear)
+        self._compare.cleared.connect(self._display.clear)
+        self._live_update_watcher.framesChanged.connect(self._display.discardFrames)
+        self._live_update_watcher.framesChanged.connect(self._loop_cache.discardFrames)
+        self._annotations.changed.connect(self.annotationsChanged)
+        self.image_canvas.strokeFinished.connect(self.addAnnotationStroke)
+        self._sequence.cleared.connect(self.scheduleLoopBake)
+        self.ui.loop_checkbox.toggled.connect(self.scheduleLoopBake)
+        self.ui.spinbox_in.valueChanged.connect(self.scheduleLoopBake)
+        self.ui.spinbox_out.valueChanged.connect(self.scheduleLoopBake)
         self.ui.checkbox_live_update.toggled.connect(self.liveUpdateToggle)
 
-    def liveUpdate(self):
-        if self._sequence.path:
-            for file_name in sorted(glob.glob(self._sequence.path.replace('#', '*')), key=lambda x: x.lower(), reverse=True):
-                if file_name != self._list_update_latest:
-                    self._list_update_latest = file_name
-                    for match in re.findall('[0-9][0-9]+', file_name[::-1]):
-                        frame = int(match[::-1])
-                        start = self.ui.spinbox_in.value()
-                        at_last_frame = self.timelineFrame() == self.ui.spinbox_out.value()
-                        self.updateRanges(start, frame)
-                        if at_last_frame and not self._playback_timer.isActive():
-                            self.setTimelineFrame(frame)
-                        break
-                break
+    def liveUpdate(self, first, last):
+        if last != self.ui.spinbox_end.value():
+            start = self.ui.spinbox_in.value()
+            at_last_frame = self.timelineFrame() == self.ui.spinbox_out.value()
+            self.updateRanges(start, last)
+            if at_last_frame and not self._playback_clock.isActive():
+                self.setTimelineFrame(last)
 
     def liveUpdateToggle(self, start):
         if start:
-            self._live_update_timer.start()
-            QtCore.QTimer.singleShot(1 * 60 * 1000, lambda: self.ui.checkbox_live_update.setChecked(False))
+            self._live_update_watcher.start()
         else:
-            self._live_update_timer.stop()
+            self._live_update_watcher.stop()
 
     def setImageScale(self, scale):
-        self._image_scale = max(0.25, min(4, scale))
+        self._image_scale = cache.mipLevel(max(0.25, min(4, scale)))
+        self._sequence.frame_cache.retainLevel(self.imageLevel(), self._sequence.namespace)
+        self._compare.frame_cache.retainLevel(self.imageLevel(), COMPARE_NAMESPACE)
+        self._prefetcher.setLevel(self.imageLevel())
+        self.scheduleLoopBake()
         if self.updateImage():
-            QtCore.QTimer.singleShot(50, lambda: self.resize(10, 10))
+            QtCore.QTimer.singleShot(50, self.adjustSize)
+
+    def imageLevel(self):
+        return sequence.imageLevel(self._image_scale, self._proxy)
+
+    def setProxy(self, enabled):
+        self._proxy = enabled
+        self.setImageScale(self._image_scale)
 
     def updateImage(self, position=1):
-        position += self.ui.spinbox_start.value()
-        sequence_item = self._sequence.getFrame(position)
-        if sequence_item:
-            image = sequence_item.getImageScaled(self._image_scale)
-            if image:
-                self.image_canvas.setPixmap(image)
-                self.statusBar().showMessage(sequence_item.image_path, 0)
-                return image
+        with profiling.timed('update_image'):
+            position += self.ui.spinbox_start.value()
+            self._sequence.frame_cache.setPlayhead(position, self._sequence.namespace)
+            sequence_item = self._sequence.getFrame(position)
+            if sequence_item:
+                if self._loop_cache.contains(position, self.imageLevel()):
+                    image = self._loop_cache.image(position)
+                elif not sequence_item.isCached(self.imageLevel()) and \
+                        self._prefetcher.isPending(sequence_item.cacheKey(self.imageLevel())):
+                    # Already decoding in the background, shown once ready instead of decoding it twice
+                    self._refine_frame = position
+                    return None
+                else:
+                    image = sequence_item.getImageScaled(self._image_scale, self._proxy)
+                    self.prefetchFrames(position)
+                if image:
+                    self.showImage(image, self.imageLevel(), position)
+                    self.updateCompare(position)
+                    if not profiling.STARTUP.finished:
+                        logger.info('Startup: %s' % profiling.STARTUP.finish('first frame'))
+                    if self._playback_clock.isActive():
+                        self.statusBar().showMessage('%s  |  %s' % (sequence_item.image_path,
+                                                                    self._playback_stats.message(
+                                                                        self._playback_clock.fps)), 0)
+                    else:
+                        self.statusBar().showMessage(sequence_item.image_path, 0)
+                    return image
+
+    def showImage(self, image, level, frame):
+        image = self._display.apply(frame, level, image)
+        with profiling.timed('set_image'):
+            self.image_canvas.setImage(image, self._image_scale / sequence.decodeScale(level))
+            self.updateOverlay(frame)
+
+    def isCompareActive(self):
+        return bool(self._compare.path) and self._compare_mode is not None
+
+    def updateCompare(self, frame, levels=None):
+        # With levels (while scrubbing) only the closest frame already decoded is shown, nothing is decoded here
+        if not self.isCompareActive():
+            return
+        compare_frame = frame + self._compare_offset
+        self._compare.frame_cache.setPlayhead(compare_frame, COMPARE_NAMESPACE)
+        level = self.imageLevel()
+        image = None
+        if levels is not None:
+            key, image = self._compare.frame_cache.nearest(compare_frame, levels, COMPARE_NAMESPACE)
+            if key is None:
+                return
+            compare_frame, level = key[0], key[1]
+        else:
+            sequence_item = self._compare.getFrame(compare_frame)
+            if sequence_item is not None and sequence_item.exists():
+                if sequence_item.isCached(level) or not self._prefetcher.isPending(sequence_item.cacheKey(level)):
+                    image = sequence_item.getImageScaled(self._image_scale, self._proxy)
+                else:
+                    # Shown once its background decode finishes, like the frame itself
+                    self._refine_frame = frame
+                    return
+        self.image_canvas.setCompareImage(self._display.apply(compare_frame, level, image, COMPARE_NAMESPACE))
+
+    def isCompareReady(self, frame):
+        if not self.isCompareActive():
+            return True
+        sequence_item = self._compare.getFrame(frame + self._compare_offset)
+        return sequence_item is None or self._compare.index.isMissing(sequence_item.frame) or \
+            sequence_item.isCached(self.imageLevel())
+
+    def loadCompare(self, file_path):
+        sequence_path, frame_digits, frame = sequence.parseSequencePath(file_path)
+        if sequence_path is None:
+            logger.warning('%s is not part of an image sequence, only sequences can be compared.' % file_path)
+            return False
+        self._compare.setPath(sequence_path, frame_digits)
+        if self._compare_mode is None:
+            self._compare_mode = canvas.COMPARE_WIPE
+        self.alignCompare()
+        self.updateImage(self.ui.timeline_slider.value())
+        self.statusBar().showMessage('Comparing with %s' % sequence_path, 2000)
+        return True
+
+    def closeCompare(self):
+        self._compare.setPath('', 1)
+        self.alignCompare()
+        self.image_canvas.setCompareImage(None)
+
+    def alignCompare(self):
+        # First frames line up, one timeline frame drives both sequences
+        if self._compare.path and self._compare.index.first() is not None:
+            self._compare_offset = self._compare.index.first() - self.ui.spinbox_start.value()
+        self._prefetcher.setCompare(self._compare if self.isCompareActive() else None, self._compare_offset)
+        self.image_canvas.setCompareMode(self._compare_mode if self.isCompareActive() else None)
+        for mode, action in self.action_compare_modes.items():
+            action.setChecked(mode == self._compare_mode)
+
+    def setCompareMode(self, mode):
+        self._compare_mode = mode
+        self.alignCompare()
+        self.updateImage(self.ui.timeline_slider.value())
+
+    def openCompareBrowser(self):
+        self.playbackStop()
+        type_filter = "Images (*.exr *.gif *.jpg *.jpeg *.png *.svg *.tga);;All Files (*.*)"
+        file_path = QtWidgets.QFileDialog.getOpenFileName(self, 'Compare With', self._recent_browser_path,
+                                                          type_filter)[0]
+        if file_path:
+            self.loadCompare(file_path)
+
+    def timelineChanged(self, position):
+        if self.ui.timeline_slider.isSliderDown():
+            # Dragging only records the latest position, the scrub update runs once per event loop pass
+            self._scrub_position = position
+            self._refine_frame = None
+            if not self._scrub_timer.isActive():
+                self._scrub_timer.start()
+            self._scrub_settle_timer.start()
+        else:
+            self._scrub_timer.stop()
+            self._scrub_settle_timer.stop()
+            self._scrub_position = None
+            self.updateImage(position)
+
+    def scrubLevel(self):
+        scale, proxy = self.imageLevel()
+        return sequence.imageLevel(scale * sequence.PROXY_SCALE if proxy else scale, True)
+
+    def scrubUpdate(self):
+        # Shows the closest frame already decoded, the frame itself is decoded at proxy resolution in the background
+        # and shown once it is ready
+        if self._scrub_position is None:
+            return
+        with profiling.timed('scrub'):
+            frame = self._scrub_position + self.ui.spinbox_start.value()
+            self._sequence.frame_cache.setPlayhead(frame, self._sequence.namespace)
+            self.image_canvas.setSmooth(False)
+            level = self.imageLevel()
+            if self._loop_cache.contains(frame, level):
+                self.showImage(self._loop_cache.image(frame), level, frame)
+                return
+            levels = (level, self.scrubLevel())
+            key, image = self._sequence.frame_cache.nearest(frame, levels, self._sequence.namespace)
+            if (key is None or key[0] != frame) and self._scrub_requested != frame:
+                self._scrub_requested = frame
+                if self._prefetcher.isEnabled():
+                    self._prefetcher.requestFrame(frame, levels[1])
+                else:
+                    sequence_item = self._sequence.getFrame(frame)
+                    if sequence_item:
+                        image = sequence_item.getImageScaled(*levels[1])
+                        key = (frame, levels[1])
+            if image is not None:
+                self.showImage(image, key[1], key[0])
+                self.updateCompare(key[0], levels)
+                sequence_item = self._sequence.getFrame(key[0])
+                if sequence_item:
+                    self.statusBar().showMessage(sequence_item.image_path, 0)
+
+    def scrubSettle(self):
+        self._scrub_timer.stop()
+        self._scrub_settle_timer.stop()
+        if self._scrub_position is None:
+            return
+        position = self._scrub_position
+        self._scrub_position = None
+        self._scrub_requested = None
+        self.image_canvas.setSmooth(True)
+        frame = position + self.ui.spinbox_start.value()
+        sequence_item = self._sequence.getFrame(frame)
+        if sequence_item is None or self.isFrameReady(sequence_item) or not self._prefetcher.isEnabled():
+            self.updateImage(position)
+        else:
+            # Refine in the background too, the full resolution frame replaces the scrub image when it is decoded
+            self._refine_frame = frame
+            self.prefetchFrames(frame)
+
+    def setExposure(self, exposure):
+        self._display.setExposure(exposure)
+        self.displayChanged()
+
+    def setGamma(self, gamma):
+        self._display.setGamma(gamma)
+        self.displayChanged()
+
+    def loadLut(self, path):
+        try:
+            self._display.setLut(path)
+        except (IOError, OSError, ValueError) as e:
+            logger.warning('Could not load display LUT %s: %s' % (path, e))
+            return False
+        return True
+
+    def openLutBrowser(self):
+        path = QtWidgets.QFileDialog.getOpenFileName(self, 'Load Display LUT', self._recent_browser_path,
+                                                     'LUTs (*.cube);;All Files (*.*)')[0]
+        if path and self.loadLut(path):
+            self.displayChanged()
+
+    def openGammaDialog(self):
+        gamma, accepted = QtWidgets.QInputDialog.getDouble(self, 'Gamma', 'Display gamma', self._display.gamma, 0.1,
+                                                           4.0, 2)
+        if accepted:
+            self.setGamma(gamma)
+
+    def resetDisplay(self):
+        self._display.reset()
+        self.displayChanged()
+
+    def displayChanged(self):
+        # Playback picks the new settings up on the next frame, a paused frame is redrawn now
+        if not self._playback_clock.isActive():
+            self.updateImage(self.ui.timeline_slider.value())
+        exposure, gamma, lut_path = self._display.settings()
+        self.statusBar().showMessage('Exposure %+.1f, gamma %.2f%s' % (
+            exposure, gamma, ', LUT %s' % os.path.basename(lut_path) if lut_path else ''), 2000)
+
+    def setHudVisible(self, visible):
+        self._hud = visible
+        if visible:
+            self._hud_timer.start()
+            self.updateHud()
+        else:
+            self._hud_timer.stop()
+            self.image_canvas.setHudText(None)
+
+    def updateHud(self):
+        cache_stats = self._sequence.frame_cache.stats()
+        timings = dict((name, profiling.PROFILER.stats(name)) for name in ('decode', 'scale', 'set_image', 'paint'))
+        lines = ['%.2f/%.2f fps  %d dropped' % (self._playback_stats.fps(), self._playback_clock.fps,
+                                                self._playback_stats.dropped)]
+        lines += ['%-10s %6.1f ms  p95 %6.1f ms' % (name, timings[name]['p50_ms'], timings[name]['p95_ms'])
+                  for name in ('decode', 'scale', 'set_image', 'paint')]
+        lines.append('cache %3.0f%% hit  %.0f MB  %d frames' % (cache_stats['hit_rate'] * 100,
+                                                                cache_stats['bytes'] / 1048576.0,
+                                                                cache_stats['frames']))
+        if self._file_reader is not None:
+            io_stats = self._file_reader.stats()
+            lines.append('io %6.1f MB/s  p95 %6.1f ms  wait %.1f ms' % (
+                io_stats['mb_per_s'], io_stats['latency_p95_ms'], io_stats['wait_p95_ms']))
+        self.image_canvas.setHudText('\n'.join(lines))
+
+    def stats(self):
+        stats = {'path': self._sequence.path,
+                 'frame': self.timelineFrame(),
+                 'first': self.ui.spinbox_start.value(),
+                 'last': self.ui.spinbox_end.value(),
+                 'loop': self.ui.loop_checkbox.isChecked(),
+                 'in': self.ui.spinbox_in.value(),
+                 'out': self.ui.spinbox_out.value(),
+                 'playing': self._playback_clock.isActive(),
+                 'fps': self._playback_clock.fps,
+                 'playback_fps': self._playback_stats.fps(),
+                 'dropped': self._playback_stats.dropped,
+                 'cache': self._sequence.frame_cache.stats()}
+        if self._file_reader is not None:
+            stats['io'] = self._file_reader.stats()
+        if len(self._playlist):
+            stats['shot'] = self._playlist.index
+            stats['shots'] = len(self._playlist)
+        return stats
+
+    def playbackRange(self):
+        if self.ui.loop_checkbox.isChecked():
+            return self.ui.spinbox_in.value(), self.ui.spinbox_out.value()
+        return self.ui.spinbox_start.value(), self.ui.spinbox_end.value()
+
+    def prefetchFrames(self, position):
+        first, last = self.playbackRange()
+        self._prefetcher.request(position, first, last, self._playback_direction, self.ui.loop_checkbox.isChecked())
+        self.warmNextShot()
+
+    def warmNextShot(self):
+        next_path = self._playlist.peek()
+        if next_path is None or not self._prefetcher.isEnabled():
+            return
+        sequence_path, frame_digits, frame = sequence.parseSequencePath(next_path)
+        if sequence_path is None:
+            return
+        warmed_key = (sequence_path, self.imageLevel())
+        if self._warmed.get(warmed_key) == self._prefetcher.generation():
+            return
+        frame_cache = self._sequence.frame_cache
+        if sequence_path != self._warm.path:
+            if self._warm.namespace != self._sequence.namespace:
+                # Skipped, the shot warmed before is left to be evicted like any other shot left
+                frame_cache.clearPlayhead(self._warm.namespace)
+            self._warm.setPath(sequence_path, frame_digits, retain=True)
+        index = self._warm.index
+        frame = frame if frame is not None and index.exists(frame) else index.first()
+        frames = []
+        while frame is not None and len(frames) < self._prefetcher.depth:
+            frames.append(frame)
+            frame = index.next(frame)
+        if frames:
+            # A playhead on the first frame ranks the warmed frames with the read-ahead of the shot shown, they are not
+            # evicted by the next frame decoded
+            frame_cache.setPlayhead(frames[0], self._warm.namespace)
+        self._warmed[warmed_key] = self._prefetcher.generation()
+        self._prefetcher.warm(self._warm, frames, self.imageLevel())
+
+    def loadPlaylist(self, paths):
+        self._playlist = playlist.Playlist(paths)
+        return self.loadShot(0)
+
+    def loadShot(self, index):
+        if not self._playlist.setIndex(index):
+            return False
+        # Shots of a playlist play at the same zoom, frames warmed at that level are used as they are
+        self.loadSequence(self._playlist.current(), scale=self._image_scale)
+        self.statusBar().showMessage('Shot %d/%d: %s' % (index + 1, len(self._playlist), self._playlist.current()),
+                                     2000)
+        return True
+
+    def nextShot(self):
+        return self.loadShot(self._playlist.index + 1)
+
+    def previousShot(self):
+        return self.loadShot(self._playlist.index - 1)
 
     def updateRanges(self, start=None, end=None):
         start = start or self.ui.spinbox_start.value()
@@ -162,6 +606,7 @@ class SequencePlayer(QtWidgets.QMainWindow):
             self.setTimelineFrame(self.ui.timeline_slider.maximum())
 
     def frameIncrement(self):
+        self._playback_direction = 1
         if self.ui.loop_checkbox.isChecked():
             if self.timelineFrame() < self.ui.spinbox_out.value():
                 self.setTimelineFrame(self.timelineFrame() + 1)
@@ -175,6 +620,7 @@ class SequencePlayer(QtWidgets.QMainWindow):
 
     def frameDecrement(self):
         self.playbackStop()
+        self._playback_direction = -1
         if self.ui.loop_checkbox.isChecked():
             if self.timelineFrame() > self.ui.spinbox_in.value():
                 self.setTimelineFrame(self.timelineFrame() - 1)
@@ -182,21 +628,88 @@ class SequencePlayer(QtWidgets.QMainWindow):
                 self.setTimelineFrame(self.ui.spinbox_out.value())
         else:
             if self.timelineFrame() > self.ui.spinbox_start.value():
-                self.setTimelineFrame(self.timelineFrame() + 1)
+                self.setTimelineFrame(self.timelineFrame() - 1)
 
     def setPlaybackSpeed(self):
-        self._playback_timer.setInterval(1000.0 / self.ui.spinbox_fps.value())
+        self._playback_clock.setFps(self.ui.spinbox_fps.value())
+
+    def setPlayEveryFrame(self, enabled):
+        self._play_every_frame = enabled
+        if self._playback_clock.isActive():
+            self.playbackStart()
+
+    def playbackFrame(self, steps):
+        frame = self._playback_anchor + steps
+        first, last = self.playbackRange()
+        if frame > last:
+            if not self.ui.loop_checkbox.isChecked():
+                return None
+            frame = first + (frame - first) % (last - first + 1)
+        return frame
+
+    def playbackTick(self, decoded_frame=None):
+        if self._play_every_frame:
+            steps = self._playback_shown + 1
+        else:
+            steps = self._playback_clock.framesElapsed()
+            if steps <= self._playback_shown:
+                return
+        frame = self.playbackFrame(steps)
+        if frame is None:
+            if self._playlist.peek() is not None:
+                # A playlist plays through, the next shot starts on frames warmed while this one played
+                self.nextShot()
+                self.playbackStart()
+                return
+            self.setTimelineFrame(self.ui.spinbox_end.value())
+            self.playbackStop()
+            return
+        if self._prefetcher.isEnabled():
+            sequence_item = self._sequence.getFrame(frame)
+            if sequence_item and frame != decoded_frame and not self.isFrameReady(sequence_item):
+                # Not decoded yet, skip it rather than block the GUI thread and fall behind real time. Playing every
+                # frame it is waited for instead, it is shown as soon as it is decoded
+                self._playback_waiting = frame
+                self.prefetchFrames(frame)
+                return
+        self._playback_waiting = None
+        self._playback_direction = 1
+        timer = QtCore.QElapsedTimer()
+        timer.start()
+        self.setTimelineFrame(frame)
+        self._playback_stats.frameShown(timer.nsecsElapsed() / 1000000.0, steps - self._playback_shown - 1)
+        self._playback_shown = steps
+
+    def isFrameReady(self, sequence_item):
+        level = self.imageLevel()
+        return (self._loop_cache.contains(sequence_item.frame, level) or sequence_item.isCached(level)) and \
+            self.isCompareReady(sequence_item.frame)
+
+    def playbackFrameReady(self, frame):
+        if frame == self._refine_frame:
+            self._refine_frame = None
+            if frame == self.timelineFrame():
+                self.updateImage(self.ui.timeline_slider.value())
+        if self._playback_clock.isActive() and (not self._play_every_frame or frame == self._playback_waiting):
+            self.playbackTick(frame)
+        elif self._scrub_position is not None and frame == self._scrub_requested:
+            self.scrubUpdate()
 
     def playbackStart(self):
-        self._playback_timer.start()
+        self._playback_anchor = self.timelineFrame()
+        self._playback_shown = 0
+        self._playback_stats.reset()
+        self._playback_clock.start()
+        self.image_canvas.setSmooth(False)
         self.ui.button_playpause.setText('Pause')
 
     def playbackStop(self):
-        self._playback_timer.stop()
+        self._playback_clock.stop()
+        self.image_canvas.setSmooth(True)
         self.ui.button_playpause.setText('Play')
 
     def togglePlayPause(self):
-        if self._playback_timer.isActive():
+        if self._playback_clock.isActive():
             self.playbackStop()
         else:
             if self.ui.spinbox_end.value() > self.ui.spinbox_start.value():
@@ -224,58 +737,76 @@ class SequencePlayer(QtWidgets.QMainWindow):
         else:
             logger.info('User aborted.')
 
-    def loadSequence(self, file_path, start=None, end=None):
-        self._playback_timer.stop()
-        file_dir = os.path.abspath(os.path.dirname(file_path))
-        self._recent_browser_path = file_dir
-        file_name = os.path.basename(file_path)
-        if '$F' not in file_name and not re.findall('[0-9][0-9]+', file_name):
+    def loadSequence(self, file_path, start=None, end=None, scale=1.0):
+        self._playback_clock.stop()
+        self._recent_browser_path = os.path.abspath(os.path.dirname(file_path))
+        sequence_path, frame_digits, frame = sequence.parseSequencePath(file_path)
+        if sequence_path is None:
             # Single frame
-            self._sequence.clear()
+            self.setSequencePath('', 1)
             self._sequence.addFrame(1, file_path)
-            self.setTimelineMin(1)
-            self.setTimelineMax(1)
-            self.timelineNow(1)
+            self.updateRanges(1, 1)
+            self.setTimelineFrame(1)
         else:
-            # Sequence
-            if '$F4' in file_name:
-                prefix, postfix = file_path.split('$F4')
-                frame_digits = 4
-            elif '$F' in file_name:
-                prefix, postfix = file_path.split('$F')
-                frame_digits = 1
-            else:
-                postfix, prefix = [x[::-1] for x in re.split('[0-9][0-9]+', file_name[::-1], 1)]
-                frame_digits = len(file_name) - len(prefix) - len(postfix)
-                if prefix[-1] == '-':
-                    prefix = prefix[0:-1]
-            sequence_path = os.path.join(file_dir, prefix + '#' + postfix)
-            self._sequence.setPath(sequence_path, frame_digits)
-            if not start or not end:
-                frames = sorted(glob.glob(sequence_path.replace('#', '-' + '[0-9]' * frame_digits)), reverse=True)
-                frames += sorted(glob.glob(sequence_path.replace('#', '[0-9]' * frame_digits)))
-                if not start:
-                    start = frames[0][-len(postfix) - frame_digits - 1:-len(postfix)]
-                    if start[0] != '-':
-                        start = start[1::]
-                    start = int(start)
-                if not end:
-                    end = frames[-1][-len(postfix) - frame_digits - 1:-len(postfix)]
-                    if end[0] != '-':
-                        end = end[1::]
-                    end = int(end)
+            # Sequence, already indexed when the first frame was preloaded
+            if sequence_path != self._preloaded_path:
+                self.setSequencePath(sequence_path, frame_digits)
+            self._preloaded_path = None
+            if not start:
+                start = self._sequence.index.first()
+            if not end:
+                end = self._sequence.index.last()
             self.updateRanges(start, end)
-            if '$F' not in file_name:
-                self.timelineNow(int(file_name[len(prefix):-len(postfix)]))
-        self.setImageScale(1.0)
+            if frame is not None:
+                self.setTimelineFrame(frame)
+        self.alignCompare()
+        self.setImageScale(scale)
+        self.loadAnnotations()
+
+    def setSequencePath(self, sequence_path, frame_digits):
+        # The shot left keeps its frames, without a playhead they are the first to go once the budget is reached
+        self._sequence.frame_cache.clearPlayhead(self._sequence.namespace)
+        self._sequence.setPath(sequence_path, frame_digits, retain=True)
 
     def refreshSequence(self):
-        self._sequence.clear()
+        self._sequence.refresh()
 
     def refreshFrame(self):
-        frame = self._sequence.getFrame(self.timelineFrame())
-        if frame:
-            frame.clear()
+        frame = self.timelineFrame()
+        self._sequence.refreshFrame(frame)
+        self._display.discardFrames([frame])
+        self._loop_cache.discardFrames([frame])
+        if not self._playback_clock.isActive():
+            self.updateImage(self.ui.timeline_slider.value())
+
+    def setLoopCacheEnabled(self, enabled):
+        self._loop_cache_enabled = enabled
+        if enabled:
+            self.bakeLoop()
+        else:
+            self._loop_bake_timer.stop()
+            self._loop_cache.release()
+
+    def scheduleLoopBake(self):
+        if self._loop_cache_enabled:
+            self._loop_bake_timer.start()
+
+    def bakeLoop(self):
+        if not self._loop_cache_enabled or not self.ui.loop_checkbox.isChecked() or not self._sequence.path:
+            self._loop_cache.release()
+            return
+        first, last = self.ui.spinbox_in.value(), self.ui.spinbox_out.value()
+        if not self._loop_cache.matches(first, last, self.imageLevel()):
+            self._loop_cache.bake(self._sequence, first, last, self.imageLevel())
+
+    def bakeLoopProgress(self, done, total):
+        if not self._playback_clock.isActive():
+            self.statusBar().showMessage('Baking loop to memory map: %d/%d frames' % (done, total), 2000)
+
+    def setLoopRange(self, first, last):
+        self.ui.loop_checkbox.setChecked(True)
+        self.ui.spinbox_in.setValue(first)
+        self.ui.spinbox_out.setValue(last)
 
     def setLoopIn(self, frame=None):
         self.ui.spinbox_in.setValue(frame or self.timelineFrame())
@@ -283,14 +814,58 @@ class SequencePlayer(QtWidgets.QMainWindow):
     def setLoopOut(self, frame=None):
         self.ui.spinbox_out.setValue(frame or self.timelineFrame())
 
+    def loadAnnotations(self):
+        if self._annotations.isModified():
+            self._annotations.save()
+        self._annotations.load(annotations.sidecarPath(self._sequence.path))
+        self._annotation_overlay.clear()
+        self._sequence.frame_cache.follow(annotations.OVERLAY_NAMESPACE, self._sequence.namespace)
+        self.updateOverlay()
+
+    def saveAnnotations(self):
+        if self._annotations.save():
+            self.statusBar().showMessage('Annotations saved to %s' % self._annotations.path, 2000)
+
+    def updateOverlay(self, frame=None):
+        frame = self.timelineFrame() if frame is None else frame
+        overlay = None
+        if self._annotations_visible:
+            overlay = self._annotation_overlay.image(frame, self.image_canvas.displaySize())
+        self.image_canvas.setOverlay(overlay)
+
+    def annotationsChanged(self, frame):
+        if frame == self.timelineFrame():
+            self.updateOverlay(frame)
+
+    def addAnnotationStroke(self, points):
+        self._annotations.addStroke(self.timelineFrame(), annotations.newStroke(points))
+
+    def clearAnnotations(self):
+        self._annotations.clearFrame(self.timelineFrame())
+
+    def setAnnotationsVisible(self, visible):
+        self._annotations_visible = visible
+        self.updateOverlay()
+
+    def setAnnotationsPainting(self, painting):
+        if painting:
+            self.playbackStop()
+        self.image_canvas.setPainting(painting)
+
     def annotationsToggle(self):
-        logger.warning('TODO: annotations toggle')
+        self.action_annotations.toggle()
 
     def annotationsPrevious(self):
-        logger.warning('TODO: annotations previous')
+        frame = self._annotations.previous(self.timelineFrame())
+        if frame is not None:
+            self.playbackStop()
+            self.setTimelineFrame(frame)
 
     def annotationsNext(self):
-        logger.warning('TODO: annotations next')
+        frame = self._annotations.next(self.timelineFrame())
+        if frame is not None:
+            self.playbackStop()
+            self.setTimelineFrame(frame)
 
     def populateMenu(self):
         menu_file = self.menuBar().addMenu('&File')
@@ -303,9 +878,15 @@ class SequencePlayer(QtWidgets.QMainWindow):
         item = QtWidgets.QAction('&Refresh Frame\tShift+R', menu_file)
         item.triggered.connect(self.refreshFrame)
         menu_file.addAction(item)
+        item = QtWidgets.QAction('&Compare With...', menu_file)
+        item.triggered.connect(self.openCompareBrowser)
+        menu_file.addAction(item)
+        item = QtWidgets.QAction('Close Compare', menu_file)
+        item.triggered.connect(self.closeCompare)
+        menu_file.addAction(item)
         menu_file.addSeparator()
-        item = QtWidgets.QAction('&Save Annotations', menu_file)
-        item.setEnabled(False)
+        item = QtWidgets.QAction('&Save Annotations\tCtrl+S', menu_file)
+        item.triggered.connect(self.saveAnnotations)
         menu_file.addAction(item)
         item = QtWidgets.QAction('Save && &Publish Annotations', menu_file)
         item.setEnabled(False)
@@ -318,6 +899,16 @@ class SequencePlayer(QtWidgets.QMainWindow):
         item = QtWidgets.QAction('Toggle Loop\tCtrl+L', menu_playback)
         item.triggered.connect(self.ui.loop_checkbox.toggle)
         menu_playback.addAction(item)
+        item = QtWidgets.QAction('Play Every Frame', menu_playback)
+        item.setCheckable(True)
+        item.setChecked(self._play_every_frame)
+        item.toggled.connect(self.setPlayEveryFrame)
+        menu_playback.addAction(item)
+        item = QtWidgets.QAction('Memory-Mapped Loop Cache', menu_playback)
+        item.setCheckable(True)
+        item.setChecked(self._loop_cache_enabled)
+        item.toggled.connect(self.setLoopCacheEnabled)
+        menu_playback.addAction(item)
         menu_playback.addSeparator()
         item = QtWidgets.QAction('Play/Pause\tUp/Space', menu_playback)
         item.triggered.connect(self.togglePlayPause)
@@ -340,6 +931,12 @@ class SequencePlayer(QtWidgets.QMainWindow):
         item.triggered.connect(self.frameIncrement)
         menu_playback.addAction(item)
         menu_playback.addSeparator()
+        item = QtWidgets.QAction('Previous Shot\tCtrl+Page Up', menu_playback)
+        item.triggered.connect(self.previousShot)
+        menu_playback.addAction(item)
+        item = QtWidgets.QAction('Next Shot\tCtrl+Page Down', menu_playback)
+        item.triggered.connect(self.nextShot)
+        menu_playback.addAction(item)
         menu_view = self.menuBar().addMenu('&View')
         # item = QtWidgets.QAction('Toggle &Fullscreen\tCtrl+F', menu_view)
         # menu_view.addAction(item)
@@ -359,11 +956,51 @@ class SequencePlayer(QtWidgets.QMainWindow):
         item = QtWidgets.QAction('400%\tCtrl+5', menu_view)
         item.triggered.connect(lambda: self.setImageScale(4.0))
         menu_view.addAction(item)
+        menu_view.addSeparator()
+        self.action_proxy = QtWidgets.QAction('Proxy Mode\tP', menu_view)
+        self.action_proxy.setCheckable(True)
+        self.action_proxy.setChecked(self._proxy)
+        self.action_proxy.toggled.connect(self.setProxy)
+        menu_view.addAction(self.action_proxy)
+        self.action_hud = QtWidgets.QAction('Performance HUD\tH', menu_view)
+        self.action_hud.setCheckable(True)
+        self.action_hud.toggled.connect(self.setHudVisible)
+        self.action_hud.setChecked(self._hud)
+        menu_view.addAction(self.action_hud)
+        menu_compare = menu_view.addMenu('&Compare')
+        group = QtWidgets.QActionGroup(menu_compare)
+        self.action_compare_modes = {}
+        for mode, label in ((None, 'Off'), (canvas.COMPARE_WIPE, 'Wipe'), (canvas.COMPARE_SIDE, 'Side by Side')):
+            item = QtWidgets.QAction(label, group)
+            item.setCheckable(True)
+            item.setChecked(mode == self._compare_mode)
+            item.triggered.connect(lambda checked=False, mode=mode: self.setCompareMode(mode))
+            menu_compare.addAction(item)
+            self.action_compare_modes[mode] = item
+        menu_display = menu_view.addMenu('&Display')
+        menu_display.setEnabled(display.isAvailable())
+        item = QtWidgets.QAction('Exposure +1/2 Stop\t]', menu_display)
+        item.triggered.connect(lambda: self.setExposure(self._display.exposure + 0.5))
+        menu_display.addAction(item)
+        item = QtWidgets.QAction('Exposure -1/2 Stop\t[', menu_display)
+        item.triggered.connect(lambda: self.setExposure(self._display.exposure - 0.5))
+        menu_display.addAction(item)
+        item = QtWidgets.QAction('Gamma...', menu_display)
+        item.triggered.connect(self.openGammaDialog)
+        menu_display.addAction(item)
+        item = QtWidgets.QAction('Load LUT...', menu_display)
+        item.triggered.connect(self.openLutBrowser)
+        menu_display.addAction(item)
+        menu_display.addSeparator()
+        item = QtWidgets.QAction('Reset', menu_display)
+        item.triggered.connect(self.resetDisplay)
+        menu_display.addAction(item)
         menu_annotations = self.menuBar().addMenu('&Annotations')
-        item = QtWidgets.QAction('Show\tCtrl+A', menu_annotations)
-        item.setCheckable(True)
-        item.setChecked(True)
-        menu_annotations.addAction(item)
+        self.action_annotations = QtWidgets.QAction('Show\tCtrl+A', menu_annotations)
+        self.action_annotations.setCheckable(True)
+        self.action_annotations.setChecked(self._annotations_visible)
+        self.action_annotations.toggled.connect(self.setAnnotationsVisible)
+        menu_annotations.addAction(self.action_annotations)
         menu_annotations.addSeparator()
         item = QtWidgets.QAction('Previous Annotation\tPage Up', menu_annotations)
         item.triggered.connect(self.annotationsPrevious)
@@ -372,8 +1009,13 @@ class SequencePlayer(QtWidgets.QMainWindow):
         item.triggered.connect(self.annotationsNext)
         menu_annotations.addAction(item)
         menu_annotations.addSeparator()
-        menu_annotations.addAction(QtWidgets.QAction('Paint\tCtrl+P', menu_annotations))
-        menu_annotations.addAction(QtWidgets.QAction('Clear', menu_annotations))
+        self.action_paint = QtWidgets.QAction('Paint\tCtrl+P', menu_annotations)
+        self.action_paint.setCheckable(True)
+        self.action_paint.toggled.connect(self.setAnnotationsPainting)
+        menu_annotations.addAction(self.action_paint)
+        item = QtWidgets.QAction('Clear', menu_annotations)
+        item.triggered.connect(self.clearAnnotations)
+        menu_annotations.addAction(item)
 
     def eventFilter(self, widget, event):
         if event.type() == QtCore.QEvent.KeyPress:
@@ -405,10 +1047,18 @@ class SequencePlayer(QtWidgets.QMainWindow):
                     self.close()
                 if key == QtCore.Qt.Key_A:
                     self.annotationsToggle()
+                if key == QtCore.Qt.Key_P:
+                    self.action_paint.toggle()
+                if key == QtCore.Qt.Key_S:
+                    self.saveAnnotations()
                 if key == QtCore.Qt.Key_Left:
                     self.frameToStart()
                 if key == QtCore.Qt.Key_Right:
                     self.frameToEnd()
+                if key == QtCore.Qt.Key_PageUp:
+                    self.previousShot()
+                if key == QtCore.Qt.Key_PageDown:
+                    self.nextShot()
             elif event.modifiers() & QtCore.Qt.ShiftModifier:
                 if key == QtCore.Qt.Key_R:
                     self.refreshFrame()
@@ -417,6 +1067,14 @@ class SequencePlayer(QtWidgets.QMainWindow):
                     self.setLoopIn()
                 if key == QtCore.Qt.Key_O:
                     self.setLoopOut()
+                if key == QtCore.Qt.Key_P:
+                    self.action_proxy.toggle()
+                if key == QtCore.Qt.Key_H:
+                    self.action_hud.toggle()
+                if key == QtCore.Qt.Key_BracketRight:
+                    self.setExposure(self._display.exposure + 0.5)
+                if key == QtCore.Qt.Key_BracketLeft:
+                    self.setExposure(self._display.exposure - 0.5)
                 if key == QtCore.Qt.Key_Space:
                     self.togglePlayPause()
                 if key == QtCore.Qt.Key_Up:
@@ -465,5 +1123,22 @@ class SequencePlayer(QtWidgets.QMainWindow):
             settings.setValue('SequencePlayer/recent_browser_path', self._recent_browser_path)
 
     def closeEvent(self, event):
+        if self._server is not None:
+            self._server.close()
+        self._prefetcher.cancel()
+        self._prefetcher.wait()
+        self._loop_cache.release()
+        if self._decoder is not None:
+            self._decoder.shutdown()
+        if self._file_reader is not None:
+            self._file_reader.shutdown()
+        self._live_update_watcher.stop()
+        self._live_update_watcher.wait()
+        if self._disk_cache:
+            self._disk_cache.wait()
+        if self._annotations.isModified():
+            self._annotations.save()
+        if self._profile_path:
+            profiling.PROFILER.dump(self._profile_path)
         self.saveSettings()
         return super(SequencePlayer, self).closeEvent(event)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player playlist
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_COMMENT = '#'
+
+
+def readPlaylist(path):
+    # One file or sequence path per line, relative paths are relative to the playlist
+    directory = os.path.dirname(os.path.abspath(path))
+    paths = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith(PLAYLIST_COMMENT):
+                paths.append(os.path.normpath(os.path.join(directory, os.path.expanduser(line))))
+    logger.info('Read %d shots from %s' % (len(paths), path))
+    return paths
+
+
+class Playlist(object):
+    def __init__(self, paths=None):
+        self.paths = list(paths or [])
+        self.index = 0
+
+    def __len__(self):
+        return len(self.paths)
+
+    def current(self):
+        return self.peek(0)
+
+    def peek(self, offset=1):
+        index = self.index + offset
+        return self.paths[index] if 0 <= index < len(self.paths) else None
+
+    def setIndex(self, index):
+        if not 0 <= index < len(self.paths):
+            return False
+        self.index = index
+        return True
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player read-ahead decoding
+"""
+
+import logging
+import threading
+
+from PySide2 import QtCore
+
+import sequenceplayer.sequence as sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_WORKERS = 2
+DEFAULT_PREFETCH_DEPTH = 8
+# Prefetch threads decode themselves, or hand the decode to worker processes (sequenceplayer.decoder)
+DECODE_BACKENDS = ('thread', 'process')
+# Below the default priority of 0, queued work of the shown sequence always runs first
+WARM_PRIORITY = -1
+
+
+class DecodeTask(QtCore.QRunnable):
+    def __init__(self, prefetcher, sequence_frame, level, generation, timeline_frame):
+        QtCore.QRunnable.__init__(self)
+        self.setAutoDelete(True)
+        self.prefetcher = prefetcher
+        self.sequence_frame = sequence_frame
+        self.level = level
+        self.generation = generation
+        self.timeline_frame = timeline_frame
+
+    def run(self):
+        self.prefetcher.decode(self.sequence_frame, self.level, self.generation, self.timeline_frame)
+
+
+# Decodes the frames ahead of the playhead on a thread pool. With a compare sequence set, both sequences are queued
+# frame by frame on the same pool so neither falls behind the other. frameReady carries the timeline frame, frames
+# warmed for another sequence (the next shot of a playlist) run only when the pool is otherwise idle and are not
+# signalled
+class FramePrefetcher(QtCore.QObject):
+    frameReady = QtCore.Signal(int)
+
+    def __init__(self, image_sequence, workers=DEFAULT_PREFETCH_WORKERS, depth=DEFAULT_PREFETCH_DEPTH, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.sequence = image_sequence
+        self.depth = depth
+        self.level = sequence.FULL_LEVEL
+        self.compare = None
+        self.compare_offset = 0
+        self._workers = workers
+        self._generation = 0
+        self._pending = set()
+        self._window = set()
+        self._lock = threading.Lock()
+        self._pool = QtCore.QThreadPool(self)
+        self.setWorkers(workers)
+        self.sequence.cleared.connect(self.cancel)
+
+    def isEnabled(self):
+        return self._workers > 0 and self.depth > 0
+
+    def workers(self):
+        return self._workers
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def setWorkers(self, workers):
+        self._workers = max(0, workers)
+        self._pool.setMaxThreadCount(max(1, workers))
+
+    def setLevel(self, level):
+        if level != self.level:
+            self.cancel()
+            self.level = level
+
+    def setCompare(self, image_sequence, offset=0):
+        if image_sequence is self.compare and (image_sequence is None or offset == self.compare_offset):
+            # Loading a sequence aligns the compare again, queued decodes such as the preloaded first frame stay
+            return
+        self.cancel()
+        if self.compare is not None:
+            self.compare.cleared.disconnect(self.cancel)
+        self.compare = image_sequence
+        self.compare_offset = offset
+        if image_sequence is not None:
+            image_sequence.cleared.connect(self.cancel)
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            self._pending.clear()
+            self._window = set()
+        self._pool.clear()
+        if self.sequence.file_reader is not None:
+            self.sequence.file_reader.cancel()
+
+    def wait(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
+
+    def isPending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def framesAhead(self, frame, first, last, direction=1, loop=False, depth=None):
+        frames = []
+        for step in range(1, (self.depth if depth is None else depth) + 1):
+            ahead = frame + step * direction
+            if ahead < first or ahead > last:
+                if not loop:
+                    break
+                ahead = first + (ahead - first) % (last - first + 1)
+            if ahead == frame:
+                break
+            frames.append(ahead)
+        return frames
+
+    def request(self, frame, first, last, direction=1, loop=False):
+        if not self.isEnabled():
+            return
+        if self._window and frame not in self._window:
+            # Playhead left the read-ahead window (scrub, seek or direction change), queued frames are stale
+            self.cancel()
+        frames = [frame] + self.framesAhead(frame, first, last, direction, loop)
+        self._window = set(frames)
+        for ahead in frames:
+            self.enqueue(ahead)
+            self.enqueueCompare(ahead)
+
+    def requestFrame(self, frame, level):
+        # Only the latest frame is wanted, anything queued or still decoding for an earlier request is dropped
+        self.cancel()
+        queued = self.enqueue(frame, level)
+        return self.enqueueCompare(frame, level) or queued
+
+    def warm(self, image_sequence, frames, level=None):
+        for frame in frames:
+            self.enqueue(frame, level, image_sequence, priority=WARM_PRIORITY)
+
+    def enqueue(self, frame, level=None, image_sequence=None, timeline_frame=None, priority=0):
+        level = self.level if level is None else level
+        if image_sequence is None:
+            timeline_frame = frame
+        sequence_frame = (image_sequence or self.sequence).getFrame(frame)
+        if sequence_frame is None or sequence_frame.isCached(level):
+            return False
+        key = sequence_frame.cacheKey(level)
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            generation = self._generation
+        if priority >= 0:
+            # The file is read on the I/O pool meanwhile, the decode task only waits for what is not in memory yet
+            sequence_frame.readAhead(level)
+        self._pool.start(DecodeTask(self, sequence_frame, level, generation, timeline_frame), priority)
+        return True
+
+    def enqueueCompare(self, frame, level=None):
+        if self.compare is None:
+            return False
+        compare_frame = frame + self.compare_offset
+        if self.compare.index.isMissing(compare_frame):
+            return False
+        return self.enqueue(compare_frame, level, self.compare, frame)
+
+    def decode(self, sequence_frame, level, generation, timeline_frame):
+        if generation != self._generation:
+            return
+        try:
+            image = sequence_frame.decodeImage(level)
+        except Exception:
+            logger.exception('Prefetch failed for %s' % sequence_frame.image_path)
+            image = None
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pending.discard(sequence_frame.cacheKey(level))
+        sequence_frame.frame_cache.put(sequence_frame.cacheKey(level), image)
+        if timeline_frame is not None:
+            # Also when the decode failed, playback waiting for the frame moves on
+            self.frameReady.emit(timeline_frame)
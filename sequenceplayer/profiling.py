@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player hot path instrumentation
+"""
+
+import collections
+import csv
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SIZE = 240
+HISTOGRAM_EDGES_MS = (1, 2, 4, 8, 16, 33, 66, 133)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class Timer(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add(self.name, (time.perf_counter() - self.started) * 1000.0)
+        return False
+
+
+# Keeps the last HISTORY_SIZE samples per timer for the HUD, and every sample while a trace is being recorded
+class Profiler(object):
+    def __init__(self, history=HISTORY_SIZE):
+        self.history = history
+        self._samples = {}
+        self._trace = None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def timed(self, name):
+        return Timer(self, name)
+
+    def add(self, name, duration_ms):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = collections.deque(maxlen=self.history)
+            samples.append(duration_ms)
+            if self._trace is not None:
+                self._trace.append(((time.perf_counter() - self._started) * 1000.0, name, duration_ms,
+                                    threading.current_thread().name))
+
+    def names(self):
+        with self._lock:
+            return sorted(self._samples)
+
+    def samples(self, name):
+        with self._lock:
+            return list(self._samples.get(name, ()))
+
+    def stats(self, name):
+        samples = self.samples(name)
+        return {'count': len(samples),
+                'mean_ms': sum(samples) / len(samples) if samples else 0.0,
+                'p50_ms': percentile(samples, 0.5),
+                'p95_ms': percentile(samples, 0.95),
+                'max_ms': max(samples) if samples else 0.0}
+
+    def histogram(self, name, edges=HISTOGRAM_EDGES_MS):
+        counts = [0] * (len(edges) + 1)
+        for sample in self.samples(name):
+            bucket = 0
+            while bucket < len(edges) and sample > edges[bucket]:
+                bucket += 1
+            counts[bucket] += 1
+        labels = ['<=%gms' % edge for edge in edges] + ['>%gms' % edges[-1]]
+        return collections.OrderedDict(zip(labels, counts))
+
+    def startTrace(self):
+        with self._lock:
+            self._trace = []
+            self._started = time.perf_counter()
+
+    def dump(self, path):
+        with self._lock:
+            trace = list(self._trace or [])
+        if path.lower().endswith('.csv'):
+            with open(path, 'w') as f:
+                writer = csv.writer(f)
+                writer.writerow(['time_ms', 'name', 'duration_ms', 'thread'])
+                writer.writerows(trace)
+        else:
+            report = {'summary': dict((name, self.stats(name)) for name in self.names()),
+                      'histograms': dict((name, self.histogram(name)) for name in self.names()),
+                      'events': [{'time_ms': event[0], 'name': event[1], 'duration_ms': event[2], 'thread': event[3]}
+                                 for event in trace]}
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=1)
+        logger.info('Wrote %d profile events to %s' % (len(trace), path))
+
+
+# Time spent in each startup phase, laps stop counting once the first frame is on screen
+class Stopwatch(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.laps = []
+        self.finished = False
+        self._last = self.started
+
+    def lap(self, name):
+        if self.finished:
+            return
+        now = time.perf_counter()
+        self.laps.append((name, (now - self._last) * 1000.0))
+        self._last = now
+
+    def total(self):
+        return (self._last - self.started) * 1000.0
+
+    def finish(self, name):
+        self.lap(name)
+        self.finished = True
+        return '%s, total %.0f ms' % (', '.join('%s %.0f ms' % lap for lap in self.laps), self.total())
+
+
+PROFILER = Profiler()
+STARTUP = Stopwatch()
+
+
+def timed(name):
+    return PROFILER.timed(name)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player remote control
+
+A running player started with server_name (or --server) listens on a local socket, one JSON object per line:
+
+    {"command": "load", "path": "/shots/sh010/comp.1001.exr"}
+    {"command": "seek", "frame": 1010}
+
+and answers each with {"ok": true, "result": ...} or {"ok": false, "error": "..."}. From another process:
+
+    import sequenceplayer.remote as remote
+    remote.load('/shots/sh010/comp.1001.exr')
+    remote.stats()
+"""
+
+import json
+import logging
+
+from PySide2 import QtCore, QtNetwork
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_NAME = 'sequenceplayer'
+DEFAULT_TIMEOUT_MSECS = 5000
+# A single request line larger than this is not a command, the connection is dropped
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+class RemoteError(Exception):
+    pass
+
+
+def request(command, name=DEFAULT_SERVER_NAME, timeout=DEFAULT_TIMEOUT_MSECS, **params):
+    # Blocking, works without an event loop or QApplication so any pipeline tool can call it
+    params['command'] = command
+    socket = QtNetwork.QLocalSocket()
+    socket.connectToServer(name)
+    if not socket.waitForConnected(timeout):
+        raise RemoteError('No sequence player listening on %s: %s' % (name, socket.errorString()))
+    try:
+        socket.write(QtCore.QByteArray(json.dumps(params).encode('utf-8') + b'\n'))
+        socket.waitForBytesWritten(timeout)
+        data = b''
+        while not data.endswith(b'\n'):
+            if not socket.waitForReadyRead(timeout):
+                raise RemoteError('No answer to %s from %s: %s' % (command, name, socket.errorString()))
+            data += bytes(socket.readAll())
+    finally:
+        socket.disconnectFromServer()
+    response = json.loads(data.decode('utf-8'))
+    if not response.get('ok'):
+        raise RemoteError(response.get('error', 'Command %s failed' % command))
+    return response.get('result')
+
+
+def isRunning(name=DEFAULT_SERVER_NAME, timeout=500):
+    socket = QtNetwork.QLocalSocket()
+    socket.connectToServer(name)
+    if socket.waitForConnected(timeout):
+        socket.disconnectFromServer()
+        return True
+    return False
+
+
+def load(path, name=DEFAULT_SERVER_NAME):
+    return request('load', name, path=path)
+
+
+def loadPlaylist(paths, name=DEFAULT_SERVER_NAME):
+    return request('playlist', name, paths=list(paths))
+
+
+def compare(path, name=DEFAULT_SERVER_NAME):
+    return request('compare', name, path=path)
+
+
+def seek(frame, name=DEFAULT_SERVER_NAME):
+    return request('seek', name, frame=frame)
+
+
+def play(name=DEFAULT_SERVER_NAME):
+    return request('play', name)
+
+
+def pause(name=DEFAULT_SERVER_NAME):
+    return request('pause', name)
+
+
+def setRange(first, last, name=DEFAULT_SERVER_NAME):
+    return request('range', name, first=first, last=last)
+
+
+def setFps(fps, name=DEFAULT_SERVER_NAME):
+    return request('fps', name, fps=fps)
+
+
+def stats(name=DEFAULT_SERVER_NAME):
+    return request('stats', name)
+
+
+class RemoteConnection(QtCore.QObject):
+    def __init__(self, server, socket):
+        QtCore.QObject.__init__(self, server)
+        self.server = server
+        self.socket = socket
+        self._buffer = b''
+        socket.readyRead.connect(self.read)
+        socket.disconnected.connect(self.close)
+
+    def read(self):
+        self._buffer += bytes(self.socket.readAll())
+        while b'\n' in self._buffer:
+            line, self._buffer = self._buffer.split(b'\n', 1)
+            if line.strip():
+                self.socket.write(QtCore.QByteArray(json.dumps(self.server.handle(line)).encode('utf-8') + b'\n'))
+        if len(self._buffer) > MAX_REQUEST_BYTES:
+            logger.warning('Dropping remote connection, request too large.')
+            self.socket.abort()
+
+    def close(self):
+        self.socket.deleteLater()
+        self.deleteLater()
+
+
+# Runs commands on the player in the GUI thread, between frames, like any other event
+class RemoteServer(QtCore.QObject):
+    def __init__(self, player, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.player = player
+        self.commands = {'load': self.load,
+                         'playlist': self.loadPlaylist,
+                         'compare': self.compare,
+                         'seek': self.seek,
+                         'play': self.play,
+                         'pause': self.pause,
+                         'range': self.setRange,
+                         'fps': self.setFps,
+                         'stats': self.stats}
+        self._server = QtNetwork.QLocalServer(self)
+        self._server.newConnection.connect(self.acceptConnections)
+
+    def listen(self, name=DEFAULT_SERVER_NAME):
+        if isRunning(name):
+            logger.warning('Another sequence player already listens on %s, remote control is off.' % name)
+            return False
+        # Left behind by a player that did not shut down cleanly
+        QtNetwork.QLocalServer.removeServer(name)
+        if not self._server.listen(name):
+            logger.warning('Could not listen on %s: %s' % (name, self._server.errorString()))
+            return False
+        logger.info('Remote control listening on %s' % self._server.fullServerName())
+        return True
+
+    def close(self):
+        self._server.close()
+
+    def acceptConnections(self):
+        while self._server.hasPendingConnections():
+            RemoteConnection(self, self._server.nextPendingConnection())
+
+    def handle(self, line):
+        try:
+            params = json.loads(line.decode('utf-8'))
+            if not isinstance(params, dict):
+                raise ValueError('Expected a JSON object, got %s' % type(params).__name__)
+            command = self.commands.get(params.pop('command', None))
+            if command is None:
+                raise ValueError('Unknown command, expected one of %s' % ', '.join(sorted(self.commands)))
+            return {'ok': True, 'result': command(**params)}
+        except (ValueError, TypeError, KeyError) as e:
+            logger.debug('Remote command failed: %s' % e)
+            return {'ok': False, 'error': str(e)}
+        except Exception as e:
+            # Whatever a command raises, the client gets an answer instead of waiting for its timeout
+            logger.warning('Remote command failed: %s' % e, exc_info=True)
+            return {'ok': False, 'error': str(e) or type(e).__name__}
+
+    def load(self, path):
+        self.player.loadSequence(path)
+        self.player.playbackStart()
+        self.player.raise_()
+        self.player.activateWindow()
+        return self.player.stats()
+
+    def loadPlaylist(self, paths):
+        if not self.player.loadPlaylist(paths):
+            raise ValueError('The playlist is empty')
+        self.player.playbackStart()
+        self.player.raise_()
+        self.player.activateWindow()
+        return self.player.stats()
+
+    def compare(self, path):
+        if not self.player.loadCompare(path):
+            raise ValueError('%s is not part of an image sequence' % path)
+        return self.player.stats()
+
+    def seek(self, frame):
+        frame = int(frame)
+        self.player.playbackStop()
+        self.player.setTimelineFrame(frame)
+        return self.player.timelineFrame()
+
+    def play(self):
+        self.player.playbackStart()
+
+    def pause(self):
+        self.player.playbackStop()
+        return self.player.timelineFrame()
+
+    def setRange(self, first, last):
+        self.player.setLoopRange(int(first), int(last))
+        return self.player.stats()
+
+    def setFps(self, fps):
+        self.player.ui.spinbox_fps.setValue(float(fps))
+        return self.player.ui.spinbox_fps.value()
+
+    def stats(self):
+        return self.player.stats()
@@ -4,71 +4,415 @@
 Sequence player sequence classes
 """
 
+import array
+import bisect
+import collections
 import logging
 import os
+import re
+import threading
 
 from PySide2 import QtCore, QtGui
 
+import sequenceplayer.cache as cache
+import sequenceplayer.diskcache as diskcache
+import sequenceplayer.profiling as profiling
+
 logger = logging.getLogger(__name__)
 
+PROXY_SCALE = 0.5
+FULL_LEVEL = (1.0, False)
+
+_image_formats_lock = threading.Lock()
+_image_formats_added = False
+
 
 def addImageFormatsSupport():
-    import PySide2
-    QtCore.QCoreApplication.addLibraryPath(os.path.join(os.path.dirname(PySide2.__file__), 'plugins'))
+    # Registered on first use rather than on import, startup and tools that never read an image skip it
+    global _image_formats_added
+    with _image_formats_lock:
+        if not _image_formats_added:
+            import PySide2
+            QtCore.QCoreApplication.addLibraryPath(os.path.join(os.path.dirname(PySide2.__file__), 'plugins'))
+            _image_formats_added = True
 
 
-addImageFormatsSupport()
+def imageLevel(scale=1.0, proxy=False):
+    # Zooming past full resolution is done by the canvas while painting, those levels share the full decode
+    return min(cache.mipLevel(scale), 1.0), bool(proxy)
 
 
-class SequenceFrame(QtCore.QObject):
-    def __init__(self, image_path, parent=None):
-        QtCore.QObject.__init__(self, parent)
-        self.image_path = image_path
-        self.image = None
+def decodeScale(level):
+    scale, proxy = level
+    return scale * (PROXY_SCALE if proxy else 1.0)
+
+
+def parseSequencePath(file_path):
+    # Returns (sequence_path, digits, frame), sequence_path is None for a single image
+    file_dir = os.path.abspath(os.path.dirname(file_path))
+    file_name = os.path.basename(file_path)
+    if '$F' not in file_name and not re.findall('[0-9][0-9]+', file_name):
+        return None, 0, None
+    frame = None
+    if '$F4' in file_name:
+        prefix, postfix = file_name.split('$F4', 1)
+        digits = 4
+    elif '$F' in file_name:
+        prefix, postfix = file_name.split('$F', 1)
+        digits = 1
+    else:
+        postfix, prefix = [x[::-1] for x in re.split('[0-9][0-9]+', file_name[::-1], 1)]
+        digits = len(file_name) - len(prefix) - len(postfix)
+        if prefix[-1:] == '-':
+            prefix = prefix[0:-1]
+        frame = int(file_name[len(prefix):len(file_name) - len(postfix)])
+    return os.path.join(file_dir, prefix + '#' + postfix), digits, frame
+
+
+def framePath(path, digits, frame):
+    if frame < 0:
+        return path.replace('#', '-%0' + str(digits) + 'd') % -frame
+    return path.replace('#', '%0' + str(digits) + 'd') % frame
+
+
+def framePattern(path):
+    prefix, postfix = os.path.basename(path).split('#', 1)
+    return re.compile(re.escape(prefix) + '(-?)([0-9]+)' + re.escape(postfix) + '$')
+
+
+def parseFrame(file_name, pattern, digits):
+    match = pattern.match(file_name)
+    if match:
+        sign, number = match.groups()
+        # Only accept names the sequence path would generate, e.g. no 00012 for a 4 digit padding
+        if len(number) == digits or (len(number) > digits and not number.startswith('0')):
+            return -int(number) if sign else int(number)
+    return None
+
+
+FrameInfo = collections.namedtuple('FrameInfo', ['name', 'size', 'mtime'])
+
+
+def scanFrames(path, digits):
+    # One directory pass, every frame is stat'ed so files re-rendered in place show up with their new size and mtime
+    frames = {}
+    pattern = framePattern(path)
+    with os.scandir(os.path.dirname(path) or '.') as entries:
+        for entry in entries:
+            frame = parseFrame(entry.name, pattern, digits)
+            if frame is None:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            frames[frame] = FrameInfo(entry.name, stat.st_size, stat.st_mtime)
+    return frames
+
+
+def findFrame(frames, frame):
+    position = bisect.bisect_left(frames, frame)
+    if position < len(frames) and frames[position] == frame:
+        return position
+    return None
+
+
+# Frame numbers, file sizes and modification times in parallel arrays sorted by frame, 24 bytes a frame. Lookups are
+# a binary search and file names are generated when asked for, long sequences cost no per-frame Python objects. The
+# three arrays are replaced together in one assignment, prefetch threads reading while a scan is applied always see
+# columns that belong together
+class SequenceIndex(object):
+    def __init__(self, path=None, digits=4):
+        self.path = path
+        self.digits = digits
+        self.scanned = False
+        self._columns = (array.array('q'), array.array('q'), array.array('d'))
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def __contains__(self, frame):
+        return self.position(frame) is not None
+
+    def position(self, frame):
+        return findFrame(self._columns[0], frame)
+
+    def framePath(self, frame):
+        return framePath(self.path, self.digits, frame)
+
+    def refresh(self):
+        if not self.path:
+            return [], [], []
+        try:
+            frames = scanFrames(self.path, self.digits)
+        except OSError as e:
+            logger.warning('Could not scan %s: %s' % (os.path.dirname(self.path), e))
+            frames = {}
+        return self.update(frames)
+
+    def restat(self, frame):
+        frames, sizes, mtimes = self._columns
+        position = findFrame(frames, frame)
+        if position is None:
+            return False
+        try:
+            stat = os.stat(self.framePath(frame))
+        except OSError as e:
+            logger.warning('Could not stat frame %d: %s' % (frame, e))
+            return False
+        changed = sizes[position] != stat.st_size or mtimes[position] != stat.st_mtime
+        sizes[position] = stat.st_size
+        mtimes[position] = stat.st_mtime
+        return changed
+
+    def update(self, frames):
+        old_frames, old_sizes, old_mtimes = self._columns
+        added = []
+        changed = []
+        for frame, info in frames.items():
+            position = findFrame(old_frames, frame)
+            if position is None:
+                added.append(frame)
+            elif old_sizes[position] != info.size or old_mtimes[position] != info.mtime:
+                changed.append(frame)
+        removed = [frame for frame in old_frames if frame not in frames]
+        ordered = sorted(frames)
+        self._columns = (array.array('q', ordered),
+                         array.array('q', (frames[frame].size for frame in ordered)),
+                         array.array('d', (frames[frame].mtime for frame in ordered)))
+        self.scanned = True
+        return sorted(added), removed, sorted(changed)
+
+    def frames(self):
+        return list(self._columns[0])
+
+    def info(self, frame):
+        frames, sizes, mtimes = self._columns
+        position = findFrame(frames, frame)
+        if position is None:
+            return None
+        return FrameInfo(os.path.basename(self.framePath(frame)), sizes[position], mtimes[position])
+
+    def exists(self, frame):
+        return self.position(frame) is not None
+
+    def isMissing(self, frame):
+        return self.scanned and self.position(frame) is None
+
+    def first(self):
+        frames = self._columns[0]
+        return frames[0] if frames else None
+
+    def last(self):
+        frames = self._columns[0]
+        return frames[-1] if frames else None
+
+    def next(self, frame, direction=1):
+        frames = self._columns[0]
+        if direction >= 0:
+            position = bisect.bisect_right(frames, frame)
+            return frames[position] if position < len(frames) else None
+        position = bisect.bisect_left(frames, frame)
+        return frames[position - 1] if position > 0 else None
+
+
+def readImage(image_path, scale=1.0, data=None):
+    addImageFormatsSupport()
+    if data is not None:
+        # Decoded from bytes already in memory, the extension names the format as there is no file to probe
+        device = QtCore.QBuffer()
+        device.setData(QtCore.QByteArray(data))
+        reader = QtGui.QImageReader(device, os.path.splitext(image_path)[1][1:].lower().encode())
+    else:
+        reader = QtGui.QImageReader(image_path)
+    size = reader.size()
+    scaled = scale < 1.0 and size.isValid()
+    if scaled:
+        # JPEG decodes straight to the reduced size (DCT scaling), other formats scale while reading
+        reader.setScaledSize(size * scale)
+    with profiling.timed('decode'):
+        image = reader.read()
+    if image.isNull():
+        logger.warning('Could not read image %s: %s' % (image_path, reader.errorString()))
+        return None
+    return image if scaled else scaleImage(image, scale)
+
+
+def scaleImage(image, factor):
+    if image is None or factor == 1.0:
+        return image
+    with profiling.timed('scale'):
+        return image.scaled(image.size() * factor, QtCore.Qt.KeepAspectRatio)
+
+
+# A view of one frame, made whenever a frame is asked for and not kept by the sequence. It holds the cache, index and
+# namespace it was made with, a decode still running after the sequence moved on stores under the right key. The path
+# of a sequence frame is only formatted once it is needed
+class SequenceFrame(object):
+    __slots__ = ('frame', 'frame_cache', 'index', 'disk_cache', 'decoder', 'file_reader', 'namespace', '_image_path')
+
+    def __init__(self, image_path, frame=None, frame_cache=None, index=None, disk_cache=None, decoder=None,
+                 file_reader=None, namespace=None):
+        self._image_path = image_path
+        self.frame = frame
+        self.frame_cache = frame_cache if frame_cache is not None else cache.FrameCache()
+        self.index = index
+        self.disk_cache = disk_cache
+        self.decoder = decoder
+        self.file_reader = file_reader
+        self.namespace = namespace
+
+    @property
+    def image_path(self):
+        if self._image_path is None:
+            self._image_path = self.index.framePath(self.frame)
+        return self._image_path
+
+    def exists(self):
+        if self.index is not None and self.index.scanned:
+            return self.index.exists(self.frame)
+        return os.path.exists(self.image_path)
 
     def clear(self):
-        self.image = None
+        self.frame_cache.discardFrame(self.frame, self.namespace)
+
+    def cacheKey(self, level=FULL_LEVEL):
+        return cache.frameKey(self.frame, level, self.namespace)
+
+    def isCached(self, level=FULL_LEVEL):
+        return self.cacheKey(level) in self.frame_cache
+
+    def diskCacheKey(self, level):
+        # Only downscaled levels are kept on disk, full resolution frames would not be faster to read back
+        if self.disk_cache is None or self.index is None or decodeScale(level) >= 1.0:
+            return None
+        info = self.index.info(self.frame)
+        if info is not None:
+            return diskcache.cacheKey(self.image_path, info.size, info.mtime, level)
+
+    def readsFile(self, level=FULL_LEVEL):
+        # Decode processes open files themselves, frames found in the disk cache are not read at all
+        if self.file_reader is None or self.decoder is not None:
+            return False
+        if self.index is not None and self.index.isMissing(self.frame):
+            return False
+        key = self.diskCacheKey(level)
+        return not key or not self.disk_cache.contains(key)
+
+    def readAhead(self, level=FULL_LEVEL):
+        if self.readsFile(level):
+            self.file_reader.prefetch(self.image_path)
+
+    def decodeImage(self, level=FULL_LEVEL):
+        # With a file reader a missing file shows up as a failed read, without one it is checked first
+        if self.file_reader is None and not self.exists():
+            return None
+        if self.index is not None and self.index.isMissing(self.frame):
+            return None
+        key = self.diskCacheKey(level)
+        image = None
+        if key:
+            with profiling.timed('disk_cache_read'):
+                image = self.disk_cache.read(key)
+        if image is None:
+            if self.decoder is not None:
+                image = self.decoder.read(self.image_path, decodeScale(level))
+            elif self.file_reader is not None:
+                data = self.file_reader.read(self.image_path)
+                if data is None:
+                    return None
+                image = readImage(self.image_path, decodeScale(level), data)
+            else:
+                image = readImage(self.image_path, decodeScale(level))
+            if key:
+                self.disk_cache.store(key, image)
+        return image
 
     def getImage(self):
-        if not self.image:
-            if os.path.exists(self.image_path):
-                self.image = QtGui.QPixmap(self.image_path)
-        return self.image
+        return self.getImageScaled(1.0)
 
-    def getImageScaled(self, factor):
-        image = self.getImage()
-        if image:
-            return image.scaled(image.size() * factor, QtCore.Qt.KeepAspectRatio)
+    def getImageScaled(self, factor, proxy=False):
+        # Each reduced level is derived once and cached, full resolution is only kept while it is the level viewed
+        level = imageLevel(factor, proxy)
+        with profiling.timed('get_image_scaled'):
+            image = self.frame_cache.get(self.cacheKey(level))
+            if image is None:
+                source = self.frame_cache.peek(self.cacheKey(FULL_LEVEL))
+                image = scaleImage(source, decodeScale(level)) if source is not None else self.decodeImage(level)
+                self.frame_cache.put(self.cacheKey(level), image)
+        return image
 
 
 class Sequence(QtCore.QObject):
     cleared = QtCore.Signal()
     pathChanged = QtCore.Signal(str)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, frame_cache=None, disk_cache=None, decoder=None, file_reader=None,
+                 namespace=None):
         QtCore.QObject.__init__(self, parent)
         self.path = None
         self.digits = 4
+        # Only frames added with their own path, sequence frames are made on demand by getFrame
         self.frames = {}
+        self.frame_cache = frame_cache if frame_cache is not None else cache.FrameCache()
+        self.disk_cache = disk_cache
+        self.decoder = decoder
+        self.file_reader = file_reader
+        # Sequences sharing one frame cache keep their frames apart under their own namespace
+        self.namespace = namespace
+        self.index = SequenceIndex()
+        self._retained = {}
 
     def clear(self):
         self.frames = {}
+        self.frame_cache.discardNamespace(self.namespace)
         self.cleared.emit()
 
-    def setPath(self, path, digits):
+    def setPath(self, path, digits, retain=False):
+        if not retain:
+            self.path = path
+            self.digits = digits
+            self.index = SequenceIndex(path, digits)
+            self.index.refresh()
+            self.clear()
+            self.pathChanged.emit(path)
+            return
+        # Frames of the previous path stay in the shared cache under its namespace, within the cache budget. Setting
+        # that path again finds them, only files changed in the meantime are dropped
+        if self.path:
+            self._retained[self.path] = self.index
         self.path = path
         self.digits = digits
-        self.clear()
+        self.namespace = path
+        self.index = self._retained.pop(path, None) or SequenceIndex(path, digits)
+        added, removed, changed = self.index.refresh()
+        for frame in removed + changed:
+            self.frame_cache.discardFrame(frame, self.namespace)
+        if not path:
+            # Single images have no path to come back to
+            self.frame_cache.discardNamespace(path)
+        self.frames = {}
+        self.cleared.emit()
         self.pathChanged.emit(path)
 
+    def refresh(self):
+        self.index.refresh()
+        self.clear()
+
+    def refreshFrame(self, frame):
+        # Stat'ed again so the disk cache key of a frame re-rendered in place no longer matches the old entry
+        self.index.restat(frame)
+        self.frame_cache.discardFrame(frame, self.namespace)
+
+    def addFrame(self, frame, path):
+        self.frames.update({frame: SequenceFrame(path, frame, self.frame_cache, self.index, self.disk_cache,
+                                                 self.decoder, self.file_reader, self.namespace)})
+
     def getFrame(self, frame):
-        if self.path:
-            if frame not in self.frames:
-                if frame < 0:
-                    path = self.path.replace('#', '-%0' + str(self.digits) + 'd')
-                else:
-                    path = self.path.replace('#', '%0' + str(self.digits) + 'd')
-                self.frames.update({frame: SequenceFrame(path % abs(frame))})
+        if frame in self.frames:
             return self.frames[frame]
+        if self.path:
+            return SequenceFrame(None, frame, self.frame_cache, self.index, self.disk_cache, self.decoder,
+                                 self.file_reader, self.namespace)
         return None
 
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player live update watcher
+"""
+
+import logging
+import os
+
+from PySide2 import QtCore
+
+import sequenceplayer.sequence as sequence
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 1.0
+# Files written to network storage (NFS, SMB) by other hosts raise no change events, watched directories are still
+# polled at this slower rate
+WATCHED_POLL_INTERVAL_SECONDS = 5.0
+SCAN_DELAY_MSECS = 200
+
+
+class ScanTask(QtCore.QRunnable):
+    def __init__(self, watcher, path, digits):
+        QtCore.QRunnable.__init__(self)
+        self.setAutoDelete(True)
+        self.watcher = watcher
+        self.path = path
+        self.digits = digits
+
+    def run(self):
+        try:
+            frames = sequence.scanFrames(self.path, self.digits)
+        except OSError as e:
+            logger.warning('Live update scan failed: %s' % e)
+            frames = None
+        self.watcher.scanned.emit(self.path, frames)
+
+
+class SequenceWatcher(QtCore.QObject):
+    framesChanged = QtCore.Signal(list)
+    rangeChanged = QtCore.Signal(int, int)
+    scanned = QtCore.Signal(str, object)
+
+    def __init__(self, image_sequence, poll_interval=POLL_INTERVAL_SECONDS, parent=None,
+                 watched_poll_interval=WATCHED_POLL_INTERVAL_SECONDS):
+        QtCore.QObject.__init__(self, parent)
+        self.sequence = image_sequence
+        self.poll_interval = poll_interval
+        self.watched_poll_interval = watched_poll_interval
+        self._range = None
+        self._requested = False
+        self._scanning = False
+        self._dirty = False
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.scheduleScan)
+        self._scan_timer = QtCore.QTimer(self)
+        self._scan_timer.setSingleShot(True)
+        self._scan_timer.setInterval(SCAN_DELAY_MSECS)
+        self._scan_timer.timeout.connect(self.scan)
+        self._poll_timer = QtCore.QTimer(self)
+        self._poll_timer.timeout.connect(self.scan)
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self.scanned.connect(self._scanFinished)
+        self.sequence.pathChanged.connect(self._pathChanged)
+
+    def isActive(self):
+        return bool(self._watcher.directories()) or self._poll_timer.isActive()
+
+    def start(self):
+        # Requested before a sequence is loaded, watching starts with the first path
+        self._requested = True
+        if not self.sequence.path:
+            return
+        directory = os.path.dirname(self.sequence.path)
+        if directory in self._watcher.directories() or self._watcher.addPath(directory):
+            self._poll_timer.setInterval(int(self.watched_poll_interval * 1000))
+        else:
+            logger.info('Cannot watch %s, polling every %.1f seconds instead.' % (directory, self.poll_interval))
+            self._poll_timer.setInterval(int(self.poll_interval * 1000))
+        self._poll_timer.start()
+        self.scan()
+
+    def stop(self):
+        self._requested = False
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+        self._poll_timer.stop()
+        self._scan_timer.stop()
+
+    def scheduleScan(self):
+        # Renders touch the directory for every frame written, so bursts of changes are coalesced into one scan
+        if not self._scan_timer.isActive():
+            self._scan_timer.start()
+
+    def scan(self):
+        if not self.sequence.path:
+            return
+        if self._scanning:
+            self._dirty = True
+            return
+        self._scanning = True
+        self._dirty = False
+        # The directory is listed and stat'ed off the GUI thread, the index is only updated once the scan is back
+        self._pool.start(ScanTask(self, self.sequence.path, self.sequence.digits))
+
+    def _pathChanged(self, path):
+        requested = self._requested
+        self.stop()
+        self._range = (self.sequence.index.first(), self.sequence.index.last())
+        if requested:
+            self.start()
+
+    def _scanFinished(self, path, frames):
+        self._scanning = False
+        if path == self.sequence.path and frames is not None:
+            added, removed, changed = self.sequence.index.update(frames)
+            for frame in removed + changed:
+                self.sequence.frame_cache.discardFrame(frame, self.sequence.namespace)
+            if changed:
+                self.framesChanged.emit(changed)
+            frame_range = (self.sequence.index.first(), self.sequence.index.last())
+            if len(self.sequence.index) and frame_range != self._range:
+                self._range = frame_range
+                self.rangeChanged.emit(*frame_range)
+        if self._dirty and self.isActive():
+            self.scan()
+
+    def wait(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player annotations tests
+"""
+
+import json
+import os
+
+import sequenceplayer.annotations as annotations
+
+
+def storeAt(path):
+    store = annotations.AnnotationStore()
+    store.load(str(path))
+    return store
+
+
+def journalRecords(path):
+    with open(str(path)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def testSidecarPath():
+    assert annotations.sidecarPath('/shots/comp.#.exr') == os.path.join('/shots', 'comp' + annotations.SIDECAR_SUFFIX)
+    assert annotations.sidecarPath('/shots/#.exr') == os.path.join('/shots', 'sequence' + annotations.SIDECAR_SUFFIX)
+    assert annotations.sidecarPath('/shots/plate.exr') is None
+    assert annotations.sidecarPath(None) is None
+
+
+def testNextAndPrevious():
+    store = annotations.AnnotationStore()
+    for frame in (5, 1, 9):
+        store.addStroke(frame, annotations.newStroke([0.1, 0.1, 0.2, 0.2]))
+    assert store.frames() == [1, 5, 9]
+    assert store.next(1) == 5
+    assert store.next(9) is None
+    assert store.previous(5) == 1
+    assert store.previous(1) is None
+    store.clearFrame(5)
+    assert store.frames() == [1, 9]
+    assert 5 not in store
+
+
+def testSaveAppendsOnlyChanges(tmp_path):
+    path = tmp_path / 'comp.annotations.jsonl'
+    store = storeAt(path)
+    store.addStroke(1, annotations.newStroke([0.1, 0.2, 0.3, 0.4], width=2))
+    assert store.isModified()
+    assert store.save()
+    assert not store.isModified()
+    store.addStroke(2, annotations.newStroke([0.5, 0.5, 0.6, 0.6]))
+    store.clearFrame(1)
+    assert store.save()
+    assert [record['op'] for record in journalRecords(path)] == ['stroke', 'stroke', 'clear']
+    loaded = storeAt(path)
+    assert loaded.frames() == [2]
+    assert loaded.strokes(2)[0].color == annotations.DEFAULT_COLOR
+
+
+def testLoadSkipsBadRecords(tmp_path):
+    path = tmp_path / 'comp.annotations.jsonl'
+    path.write_text('{"op": "stroke", "frame": 3, "points": [0.1, 0.1]}\n{"op": "stroke", "fra\n')
+    store = storeAt(path)
+    assert store.frames() == [3]
+    assert len(store.strokes(3)) == 1
+
+
+def testSaveCompactsJournal(tmp_path):
+    path = tmp_path / 'comp.annotations.jsonl'
+    store = storeAt(path)
+    for repeat in range(annotations.COMPACT_MIN_RECORDS):
+        store.addStroke(1, annotations.newStroke([0.1, 0.1, 0.2, 0.2]))
+        store.clearFrame(1)
+        assert store.save()
+    store.addStroke(4, annotations.newStroke([0.3, 0.3, 0.4, 0.4]))
+    assert store.save()
+    records = journalRecords(path)
+    assert len(records) < annotations.COMPACT_MIN_RECORDS
+    assert [record['frame'] for record in records if record['op'] == 'stroke'][-1] == 4
+    assert storeAt(path).frames() == [4]
+    assert not os.path.exists(str(path) + '.tmp')
+
+
+def testSaveWithoutPath():
+    store = annotations.AnnotationStore()
+    store.addStroke(1, annotations.newStroke([0.1, 0.1]))
+    assert not store.save()
+    assert store.isModified()
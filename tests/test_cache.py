@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player frame cache tests
+"""
+
+import sequenceplayer.cache as cache
+
+
+# Stands in for a QImage, the cache only asks for the size
+class FakeImage(object):
+    def __init__(self, width=10, height=10, depth=32):
+        self._width = width
+        self._height = height
+        self._depth = depth
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def depth(self):
+        return self._depth
+
+
+def fillCache(frame_cache, frames, level=1.0, namespace=None):
+    for frame in frames:
+        frame_cache.put(cache.frameKey(frame, level, namespace), FakeImage())
+
+
+def testFrameKey():
+    assert cache.frameKey(3, 1.0) == (3, 1.0)
+    assert cache.frameKey(3, 1.0, 'compare') == (3, 1.0, 'compare')
+    assert cache.keyNamespace((3, 1.0)) is None
+    assert cache.keyNamespace((3, 1.0, 'compare')) == 'compare'
+
+
+def testMipLevel():
+    assert cache.mipLevel(1.1) == 1.0
+    assert cache.mipLevel(0.3) == 0.25
+    assert cache.mipLevel(10) == 4.0
+
+
+def testPutAndGetCountBytesAndHits():
+    frame_cache = cache.FrameCache()
+    image = FakeImage(4, 2, 32)
+    frame_cache.put((1, 1.0), image)
+    assert frame_cache.bytes == 32
+    assert frame_cache.get((1, 1.0)) is image
+    assert frame_cache.get((2, 1.0)) is None
+    assert frame_cache.hits == 1
+    assert frame_cache.misses == 1
+    frame_cache.put((1, 1.0), FakeImage(4, 2, 32))
+    assert frame_cache.bytes == 32
+    frame_cache.put((2, 1.0), None)
+    assert (2, 1.0) not in frame_cache
+
+
+def testImageLargerThanBudgetIsNotCached():
+    frame_cache = cache.FrameCache(max_bytes=100)
+    frame_cache.put((1, 1.0), FakeImage(10, 10, 32))
+    assert len(frame_cache) == 0
+    assert frame_cache.bytes == 0
+
+
+def testEvictsLeastRecentlyUsedWithoutPlayhead():
+    frame_cache = cache.FrameCache(max_bytes=None, max_frames=3)
+    fillCache(frame_cache, [1, 2, 3])
+    frame_cache.get((1, 1.0))
+    fillCache(frame_cache, [4])
+    assert sorted(key[0] for key in frame_cache._items) == [1, 3, 4]
+    assert frame_cache.evictions == 1
+
+
+def testEvictsFarthestFromPlayhead():
+    frame_cache = cache.FrameCache(max_bytes=None, max_frames=3)
+    frame_cache.setPlayhead(10)
+    fillCache(frame_cache, [20, 9, 10, 11])
+    assert sorted(key[0] for key in frame_cache._items) == [9, 10, 11]
+    # The frame just put is kept, the next farthest goes
+    fillCache(frame_cache, [30])
+    assert sorted(key[0] for key in frame_cache._items) == [10, 11, 30]
+
+
+def testEvictsByteBudget():
+    frame_cache = cache.FrameCache(max_bytes=3 * 400)
+    fillCache(frame_cache, range(5))
+    assert len(frame_cache) == 3
+    assert frame_cache.bytes == 3 * 400
+
+
+def testNamespaceWithoutPlayheadGoesFirst():
+    frame_cache = cache.FrameCache(max_bytes=None, max_frames=4)
+    frame_cache.setPlayhead(1)
+    fillCache(frame_cache, [1, 2], namespace='other')
+    fillCache(frame_cache, [1, 2, 3])
+    assert [key for key in frame_cache._items if cache.keyNamespace(key) == 'other'] == [(2, 1.0, 'other')]
+    frame_cache.setPlayhead(2, 'other')
+    fillCache(frame_cache, [4])
+    assert (2, 1.0, 'other') in frame_cache
+    assert (3, 1.0) not in frame_cache
+
+
+def testFollowedNamespaceUsesSourcePlayhead():
+    frame_cache = cache.FrameCache(max_bytes=None, max_frames=6)
+    frame_cache.setPlayhead(5)
+    frame_cache.follow(('display', None), None)
+    for frame in range(1, 6):
+        frame_cache.put(cache.frameKey(frame, 1.0), FakeImage())
+        frame_cache.put(cache.frameKey(frame, 1.0, ('display', None)), FakeImage())
+    assert sorted(key[0] for key in frame_cache._items) == [3, 3, 4, 4, 5, 5]
+
+
+def testNamespacesAreDiscardedSeparately():
+    frame_cache = cache.FrameCache()
+    fillCache(frame_cache, [1, 2])
+    fillCache(frame_cache, [1, 2], namespace='compare')
+    frame_cache.discardFrame(1, 'compare')
+    assert (1, 1.0) in frame_cache
+    assert (1, 1.0, 'compare') not in frame_cache
+    frame_cache.setPlayhead(2, 'compare')
+    frame_cache.discardNamespace('compare')
+    assert len(frame_cache) == 2
+    assert 'compare' not in frame_cache.playheads
+
+
+def testRetainLevelKeepsOtherNamespaces():
+    frame_cache = cache.FrameCache()
+    fillCache(frame_cache, [1], level=0.5)
+    fillCache(frame_cache, [1], level=1.0)
+    fillCache(frame_cache, [1], level=0.5, namespace='shot')
+    frame_cache.retainLevel(1.0)
+    assert (1, 0.5) not in frame_cache
+    assert (1, 1.0) in frame_cache
+    assert (1, 0.5, 'shot') in frame_cache
+
+
+def testNearestDoesNotCountAsHit():
+    frame_cache = cache.FrameCache()
+    fillCache(frame_cache, [1, 8], level=0.5)
+    fillCache(frame_cache, [4], level=0.25)
+    fillCache(frame_cache, [5], level=0.5, namespace='compare')
+    key, image = frame_cache.nearest(5, [0.5, 0.25])
+    assert key == (4, 0.25)
+    assert image is not None
+    assert frame_cache.nearest(5, [1.0]) == (None, None)
+    assert frame_cache.hits == 0
+    assert frame_cache.misses == 0
+
+
+def testStats():
+    frame_cache = cache.FrameCache(max_bytes=1000)
+    fillCache(frame_cache, [1])
+    frame_cache.get((1, 1.0))
+    frame_cache.get((2, 1.0))
+    stats = frame_cache.stats()
+    assert stats['frames'] == 1
+    assert stats['bytes'] == 400
+    assert stats['hit_rate'] == 0.5
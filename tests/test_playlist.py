@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player playlist tests
+"""
+
+import os
+
+import sequenceplayer.playlist as playlist
+
+
+def testReadPlaylist(tmp_path):
+    path = tmp_path / 'review.txt'
+    path.write_text('# dailies\n\nsh010/comp.1001.exr\n  /shots/sh020/comp.1001.exr  \n')
+    assert playlist.readPlaylist(str(path)) == [os.path.join(str(tmp_path), 'sh010', 'comp.1001.exr'),
+                                                os.path.normpath('/shots/sh020/comp.1001.exr')]
+
+
+def testPlaylistNavigation():
+    shots = playlist.Playlist(['a', 'b', 'c'])
+    assert len(shots) == 3
+    assert shots.current() == 'a'
+    assert shots.peek() == 'b'
+    assert shots.setIndex(2)
+    assert shots.peek() is None
+    assert shots.peek(-1) == 'b'
+    assert not shots.setIndex(3)
+    assert shots.current() == 'c'
+    assert playlist.Playlist().current() is None
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sequence player sequence tests
+"""
+
+import os
+
+import sequenceplayer.sequence as sequence
+
+
+def indexOf(frames, path='/shots/comp.#.exr', digits=4):
+    index = sequence.SequenceIndex(path, digits)
+    index.update({frame: sequence.FrameInfo(os.path.basename(sequence.framePath(path, digits, frame)), size, 1.0)
+                  for frame, size in frames.items()})
+    return index
+
+
+def testParseSequencePath():
+    path, digits, frame = sequence.parseSequencePath('/shots/comp.1001.exr')
+    assert path == os.path.join('/shots', 'comp.#.exr')
+    assert digits == 4
+    assert frame == 1001
+
+
+def testParseSequencePathNegativeFrame():
+    path, digits, frame = sequence.parseSequencePath('/shots/comp.-0005.exr')
+    assert path == os.path.join('/shots', 'comp.#.exr')
+    assert digits == 4
+    assert frame == -5
+
+
+def testParseSequencePathHoudiniTokens():
+    assert sequence.parseSequencePath('/shots/comp.$F4.exr')[:2] == (os.path.join('/shots', 'comp.#.exr'), 4)
+    assert sequence.parseSequencePath('/shots/comp.$F.exr')[:2] == (os.path.join('/shots', 'comp.#.exr'), 1)
+
+
+def testParseSequencePathSingleImage():
+    assert sequence.parseSequencePath('/shots/plate.exr') == (None, 0, None)
+
+
+def testFramePath():
+    assert sequence.framePath('/shots/comp.#.exr', 4, 12) == '/shots/comp.0012.exr'
+    assert sequence.framePath('/shots/comp.#.exr', 4, -12) == '/shots/comp.-0012.exr'
+    assert sequence.framePath('/shots/comp.#.exr', 2, 1234) == '/shots/comp.1234.exr'
+
+
+def testParseFrame():
+    pattern = sequence.framePattern('/shots/comp.#.exr')
+    assert sequence.parseFrame('comp.0012.exr', pattern, 4) == 12
+    assert sequence.parseFrame('comp.-0012.exr', pattern, 4) == -12
+    assert sequence.parseFrame('comp.12345.exr', pattern, 4) == 12345
+    assert sequence.parseFrame('comp.012.exr', pattern, 4) is None
+    assert sequence.parseFrame('comp.00012.exr', pattern, 4) is None
+    assert sequence.parseFrame('comp.0012.exr.tmp', pattern, 4) is None
+    assert sequence.parseFrame('other.0012.exr', pattern, 4) is None
+
+
+def testScanFrames(tmp_path):
+    for name in ('comp.0001.exr', 'comp.0002.exr', 'comp.-0001.exr', 'comp.02.exr', 'other.0001.exr'):
+        (tmp_path / name).write_bytes(b'x' * 3)
+    frames = sequence.scanFrames(str(tmp_path / 'comp.#.exr'), 4)
+    assert sorted(frames) == [-1, 1, 2]
+    assert frames[1].name == 'comp.0001.exr'
+    assert frames[1].size == 3
+
+
+def testIndexUpdateReportsChanges():
+    index = sequence.SequenceIndex('/shots/comp.#.exr', 4)
+    assert not index.isMissing(1)
+    added, removed, changed = index.update({1: sequence.FrameInfo('comp.0001.exr', 10, 1.0),
+                                            3: sequence.FrameInfo('comp.0003.exr', 10, 1.0)})
+    assert (added, removed, changed) == ([1, 3], [], [])
+    added, removed, changed = index.update({3: sequence.FrameInfo('comp.0003.exr', 20, 1.0),
+                                            4: sequence.FrameInfo('comp.0004.exr', 10, 1.0)})
+    assert (added, removed, changed) == ([4], [1], [3])
+    assert index.frames() == [3, 4]
+    assert index.info(3) == sequence.FrameInfo('comp.0003.exr', 20, 1.0)
+    assert index.info(1) is None
+
+
+def testIndexLookups():
+    index = indexOf({-2: 1, 1: 1, 5: 1, 6: 1})
+    assert len(index) == 4
+    assert 5 in index
+    assert 2 not in index
+    assert index.first() == -2
+    assert index.last() == 6
+    assert index.isMissing(2)
+    assert not index.isMissing(5)
+    assert index.framePath(-2) == '/shots/comp.-0002.exr'
+
+
+def testIndexNext():
+    index = indexOf({1: 1, 5: 1, 6: 1})
+    assert index.next(1) == 5
+    assert index.next(2) == 5
+    assert index.next(6) is None
+    assert index.next(5, -1) == 1
+    assert index.next(1, -1) is None
+    assert index.next(100, -1) == 6
+
+
+def testEmptyIndex():
+    index = sequence.SequenceIndex()
+    assert index.first() is None
+    assert index.last() is None
+    assert index.next(1) is None
+    assert index.refresh() == ([], [], [])
+
+
+def testFindFrame():
+    assert sequence.findFrame([1, 3, 5], 3) == 1
+    assert sequence.findFrame([1, 3, 5], 4) is None
+    assert sequence.findFrame([], 4) is None
+
+
+def testImageLevel():
+    assert sequence.imageLevel(2.0) == (1.0, False)
+    assert sequence.imageLevel(0.5, True) == (0.5, True)
+    assert sequence.decodeScale((0.5, True)) == 0.5 * sequence.PROXY_SCALE